@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import os
+import threading
+import weakref
+from collections import deque
+
+from cloudshell.logging.utils.patch_logging_shutdown import (
+    patch_logging_shutdown,
+    register_shutdown_hook,
+)
+
+
+class OverflowPolicy:
+    """What to do with a record when the queue is full.
+
+    BLOCK - wait for the free space, DROP in the thread of a running event loop
+    DROP - drop records below WARNING, wait for the free space for others
+    SAMPLE - keep every N-th record below WARNING, drop the rest of them
+    """
+
+    BLOCK = "block"
+    DROP = "drop"
+    SAMPLE = "sample"
+
+    ALL = (BLOCK, DROP, SAMPLE)
+
+
+class AsyncWriter:
+    """Background thread that passes queued records to the target handlers."""
+
+    # records of this level and above are never dropped
+    KEEP_LEVEL = logging.WARNING
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        policy: str = OverflowPolicy.BLOCK,
+        sample_rate: int = 10,
+    ):
+        if policy not in OverflowPolicy.ALL:
+            raise ValueError(f"Unknown overflow policy {policy}")
+        self.max_size = max(max_size, 1)
+        self.policy = policy
+        self.sample_rate = max(sample_rate, 1)
+        self.dropped = 0
+        self._overflowed = 0
+        self._stopped = False
+        self._start()
+        _WRITERS.add(self)
+
+    def _start(self) -> None:
+        self._queue = deque()
+        self._unfinished = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._thread = threading.Thread(
+            target=self._run, name="cloudshell-logging-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _restart_after_fork(self) -> None:
+        # the thread doesn't exist in the child and locks can be held,
+        # records queued by the parent are written by the parent
+        if not self._stopped:
+            self._start()
+
+    def _should_drop(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.KEEP_LEVEL:
+            return False
+        if self.policy == OverflowPolicy.BLOCK:
+            # the event loop never waits for the writer
+            return _in_event_loop()
+        if self.policy == OverflowPolicy.SAMPLE:
+            self._overflowed += 1
+            return self._overflowed % self.sample_rate != 0
+        return True
+
+    def put(self, handler: logging.Handler, record: logging.LogRecord) -> None:
+        with self._lock:
+            if (
+                not self._stopped
+                and len(self._queue) >= self.max_size
+                and self._should_drop(record)
+            ):
+                self.dropped += 1
+                return
+        # the message is built only for the records that are not dropped
+        record = handler.prepare(record)
+        with self._lock:
+            if self._stopped:
+                # writer is stopped on shutdown, write in the caller's thread
+                handler.target.handle(record)
+                return
+            while len(self._queue) >= self.max_size:
+                self._not_full.wait()
+            self._queue.append((handler, record))
+            self._unfinished += 1
+            self._not_empty.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._queue and not self._stopped:
+                    self._not_empty.wait()
+                if not self._queue:
+                    return
+                items = list(self._queue)
+                self._queue.clear()
+                self._not_full.notify_all()
+
+            try:
+                for handler, record in items:
+                    target = handler.target
+                    if target is None:
+                        continue
+                    try:
+                        target.handle(record)
+                    except Exception:
+                        handler.handleError(record)
+            finally:
+                with self._lock:
+                    self._unfinished -= len(items)
+                    if not self._unfinished:
+                        self._all_done.notify_all()
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """Wait until all queued records are written."""
+        if threading.current_thread() is self._thread:
+            return not self._unfinished
+        with self._lock:
+            return self._all_done.wait_for(lambda: not self._unfinished, timeout)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Write queued records and stop the thread."""
+        with self._lock:
+            self._stopped = True
+            self._not_empty.notify()
+        self._thread.join(timeout)
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+_WRITERS: weakref.WeakSet[AsyncWriter] = weakref.WeakSet()
+_WRITER: AsyncWriter | None = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_async_writer(
+    max_size: int = 10000, policy: str = OverflowPolicy.BLOCK, sample_rate: int = 10
+) -> AsyncWriter:
+    """Get the writer of the current process.
+
+    Parameters are used only when the writer is created.
+    """
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = AsyncWriter(max_size, policy, sample_rate)
+                register_shutdown_hook(stop_async_writer)
+    return _WRITER
+
+
+def stop_async_writer() -> None:
+    """Write queued records and stop the writer of the current process."""
+    global _WRITER
+    with _WRITER_LOCK:
+        writer, _WRITER = _WRITER, None
+    if writer is not None:
+        writer.stop()
+
+
+def _restart_writers_after_fork() -> None:
+    global _WRITER_LOCK
+    _WRITER_LOCK = threading.Lock()
+    for writer in list(_WRITERS):
+        writer._restart_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_writers_after_fork)
+
+
+class AsyncHandler(logging.Handler):
+    """Pass records to the target handler in the background writer thread."""
+
+    def __init__(self, target: logging.Handler, writer: AsyncWriter | None = None):
+        super().__init__()
+        self.target = target
+        self.writer = writer or get_async_writer()
+        patch_logging_shutdown()
+
+    def setFormatter(self, fmt: logging.Formatter | None) -> None:
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # args can be changed by the caller before the record is written,
+        # the record is shared with the other handlers of the logger
+        msg = record.getMessage()
+        record = copy.copy(record)
+        record.msg = msg
+        record.args = None
+        return record
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # the writer has its own lock
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.writer.put(self, record)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        self.writer.drain()
+        if self.target:
+            self.target.flush()
+
+    def close(self) -> None:
+        try:
+            self.writer.drain()
+            if self.target:
+                self.target.close()
+        finally:
+            self.acquire()
+            try:
+                self.target = None
+                super().close()
+            finally:
+                self.release()
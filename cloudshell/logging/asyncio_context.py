@@ -0,0 +1,93 @@
+"""Log context for asyncio code.
+
+Tasks copy the context of the code that creates them, so tasks created in
+a command keep its log context. Tasks created by the event loop itself
+(server callbacks, tasks created from other threads) get the default log
+context of the task factory. Executors don't copy the context, functions
+passed to run_in_executor() here run in the caller's context.
+
+Records are written without blocking the loop if ASYNC_WRITE is enabled,
+file handlers and debug files are written by the background writer thread.
+When its queue is full, records below WARNING logged in the loop are dropped
+with ASYNC_OVERFLOW_POLICY block or drop and sampled with sample, the loop
+waits for the writer only with WARNING and above.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextvars import copy_context
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from cloudshell.logging.context_filters import get_logger_context, set_logger_context
+from cloudshell.logging.qs_logger import get_qs_logger
+
+T = TypeVar("T")
+
+
+def _set_default_context(folder_name: str, file_prefix: str) -> None:
+    if get_logger_context() is None:
+        set_logger_context(folder_name, file_prefix)
+
+
+def log_context_task_factory(
+    folder_name: str, file_prefix: str, task_factory: Callable | None = None
+) -> Callable[..., asyncio.Future]:
+    """Create a task factory that sets the log context to tasks without it.
+
+    :param task_factory: previous task factory of the loop, it creates tasks
+    """
+
+    def factory(loop: asyncio.AbstractEventLoop, coro, **kwargs) -> asyncio.Future:
+        context = kwargs.pop("context", None) or copy_context()
+        context.run(_set_default_context, folder_name, file_prefix)
+        # the task copies the context it's created in
+        if task_factory is not None:
+            return context.run(task_factory, loop, coro, **kwargs)
+        return context.run(asyncio.Task, coro, loop=loop, **kwargs)
+
+    return factory
+
+
+def set_log_context_task_factory(
+    folder_name: str,
+    file_prefix: str,
+    loop: asyncio.AbstractEventLoop | None = None,
+) -> None:
+    """Set the default log context of tasks of the loop, the running by default."""
+    loop = loop or asyncio.get_event_loop()
+    loop.set_task_factory(
+        log_context_task_factory(folder_name, file_prefix, loop.get_task_factory())
+    )
+
+
+def run_in_executor(
+    func: Callable[..., T],
+    *args: Any,
+    executor=None,
+    loop: asyncio.AbstractEventLoop | None = None,
+) -> asyncio.Future:
+    """Run the function in the executor with the log context of the caller."""
+    loop = loop or asyncio.get_running_loop()
+    return loop.run_in_executor(executor, partial(copy_context().run, func, *args))
+
+
+async def get_qs_logger_async(
+    log_group: str = "Ungrouped",
+    log_category: str = "cloudshell",
+    log_file_prefix: str = "QS",
+    exec_info: dict | None = None,
+    use_context: bool = True,
+) -> logging.Logger:
+    """Get the logger like get_qs_logger() without blocking the loop.
+
+    Files are opened in the default executor, the log context is set to the
+    current task.
+    """
+    logger = await run_in_executor(
+        get_qs_logger, log_group, log_category, log_file_prefix, exec_info, use_context
+    )
+    if use_context:
+        set_logger_context(folder_name=log_group, file_prefix=log_file_prefix)
+    return logger
@@ -0,0 +1,240 @@
+"""Background watcher of the config file.
+
+The directory of the config file is watched with inotify on Linux, so the
+watcher wakes up only when something is written there, editors that replace
+the file are noticed too. Without inotify the file is polled. In both cases
+the file is compared by its path, mtime, inode and size, and the callback is
+called only when they change.
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import threading
+from typing import Callable
+
+from cloudshell.logging.utils.patch_logging_shutdown import register_shutdown_hook
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+)
+# the config path is rechecked this often even if inotify doesn't wake us up,
+# QS_CONFIG can point to another file
+INOTIFY_RECHECK_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class ConfigWatcher:
+    """Call on_change in the background thread when the config file changes.
+
+    :param get_path: returns the path of the config file
+    :param on_change: called without arguments after the file is changed
+    :param interval: seconds between checks when the file is polled
+    :param use_inotify: False - always poll the file
+    """
+
+    def __init__(
+        self,
+        get_path: Callable[[], str],
+        on_change: Callable[[], None],
+        interval: float = 1,
+        use_inotify: bool = True,
+    ):
+        self.get_path = get_path
+        self.on_change = on_change
+        self.interval = interval
+        self.changes = 0
+        self._libc = _load_libc() if use_inotify else None
+        self._inotify_fd = None
+        self._watch = None
+        self._watched_dir = None
+        self._stopped = threading.Event()
+        # the pipe wakes up the thread waiting for inotify events on stop
+        self._wake_r = self._wake_w = None
+        self._thread = None
+        self._key = self._get_key()
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify_fd is not None
+
+    def _get_key(self) -> tuple:
+        path = self.get_path()
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return path, None
+        return path, (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+    def check(self) -> bool:
+        """Call on_change if the file is changed since the last check."""
+        key = self._get_key()
+        if key == self._key:
+            return False
+        self._key = key
+        self.changes += 1
+        try:
+            self.on_change()
+        except Exception:
+            logger.exception("Failed to apply changes of %s", key[0])
+        return True
+
+    def start(self) -> None:
+        if self._libc is not None:
+            self._inotify_fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if self._inotify_fd < 0:
+                self._inotify_fd = None
+            else:
+                self._wake_r, self._wake_w = os.pipe()
+                os.set_blocking(self._wake_r, False)
+        self._thread = threading.Thread(
+            target=self._run, name="cloudshell-logging-config-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopped.set()
+        if self._wake_w is not None:
+            os.write(self._wake_w, b"\0")
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return
+        self._close()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wait()
+            if not self._stopped.is_set():
+                self.check()
+
+    def _wait(self) -> None:
+        """Wait for events in the directory of the config file or the interval."""
+        if self._inotify_fd is None:
+            self._stopped.wait(self.interval)
+            return
+        directory = os.path.dirname(os.path.abspath(self.get_path()))
+        if directory != self._watched_dir and self._add_watch(directory):
+            return  # check changes made before the watch was added
+        fds = [self._wake_r]
+        timeout = self.interval
+        if self._watched_dir is not None:
+            fds.append(self._inotify_fd)
+            timeout = INOTIFY_RECHECK_INTERVAL
+        ready, _, _ = select.select(fds, [], [], timeout)
+        for fd in ready:
+            self._drain(fd)
+
+    def _add_watch(self, directory: str) -> bool:
+        if self._watch is not None:
+            self._libc.inotify_rm_watch(self._inotify_fd, self._watch)
+            self._watch = self._watched_dir = None
+        watch = self._libc.inotify_add_watch(
+            self._inotify_fd, os.fsencode(directory), WATCH_MASK
+        )
+        if watch < 0:
+            return False  # the directory doesn't exist, poll until it's created
+        self._watch, self._watched_dir = watch, directory
+        return True
+
+    @staticmethod
+    def _drain(fd: int) -> None:
+        try:
+            while os.read(fd, 4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _close(self) -> None:
+        for fd in (self._inotify_fd, self._wake_r, self._wake_w):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._inotify_fd = self._watch = self._watched_dir = None
+        self._wake_r = self._wake_w = None
+
+
+_WATCHER: ConfigWatcher | None = None
+_WATCHER_LOCK = threading.Lock()
+
+
+def start_config_watcher(
+    get_path: Callable[[], str], on_change: Callable[[], None], interval: float = 1
+) -> bool:
+    """Start the watcher of the process if it isn't running.
+
+    :return: False if the watcher is already running
+    """
+    global _WATCHER
+    with _WATCHER_LOCK:
+        if _WATCHER is not None:
+            return False
+        _WATCHER = ConfigWatcher(get_path, on_change, interval)
+        _WATCHER.start()
+        register_shutdown_hook(stop_config_watcher)
+        return True
+
+
+def get_config_watcher() -> ConfigWatcher | None:
+    return _WATCHER
+
+
+def stop_config_watcher() -> None:
+    global _WATCHER
+    with _WATCHER_LOCK:
+        watcher, _WATCHER = _WATCHER, None
+    if watcher is not None:
+        watcher.stop()
+
+
+def _clear_watcher_after_fork() -> None:
+    # the thread isn't running in the child, it's started again on demand
+    global _WATCHER, _WATCHER_LOCK
+    _WATCHER_LOCK = threading.Lock()
+    watcher, _WATCHER = _WATCHER, None
+    if watcher is not None:
+        watcher._close()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_clear_watcher_after_fork)
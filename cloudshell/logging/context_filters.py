@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from contextvars import Context, ContextVar, copy_context
 from functools import partial
 from logging import Filter, LogRecord
@@ -6,6 +8,40 @@ file_prefix_var: ContextVar[str] = ContextVar("file prefix")
 folder_name_var: ContextVar[str] = ContextVar("folder name")
 
 
+# attribute of the record with its (folder name, file prefix) or None
+LOG_CONTEXT_ATTR = "log_context"
+_UNRESOLVED = object()
+
+
+def get_logger_context() -> tuple[str, str] | None:
+    """Get (folder name, file prefix) from the current context if it's set."""
+    folder_name = folder_name_var.get(None)
+    file_prefix = file_prefix_var.get(None)
+    if folder_name is None or file_prefix is None:
+        return None
+    return folder_name, file_prefix
+
+
+def resolve_record_context(record: LogRecord) -> tuple[str, str] | None:
+    """Get the log context of the record, it's taken from the context once.
+
+    The result is kept in the record, so filters and handlers of the record
+    get the context where the record was created, even in other threads.
+    """
+    key = record.__dict__.get(LOG_CONTEXT_ATTR, _UNRESOLVED)
+    if key is _UNRESOLVED:
+        key = record.__dict__[LOG_CONTEXT_ATTR] = get_logger_context()
+    return key
+
+
+class ResolveContextFilter(Filter):
+    """Resolve the log context of records of the logger before its handlers."""
+
+    def filter(self, record: LogRecord) -> bool:  # noqa: A003
+        resolve_record_context(record)
+        return True
+
+
 class FilterByContext(Filter):
     def __init__(self, name: str, folder_name: str, file_prefix: str):
         super().__init__(name)
@@ -13,26 +49,12 @@ class FilterByContext(Filter):
         self.file_prefix = file_prefix
 
     def filter(self, record: LogRecord) -> bool:  # noqa: A003
-        try:
-            res = (
-                self.folder_name == folder_name_var.get()
-                and self.file_prefix == file_prefix_var.get()
-            )
-        except LookupError:
-            res = False
-        return res
+        return resolve_record_context(record) == (self.folder_name, self.file_prefix)
 
 
 class FilterOnlyWithoutContext(Filter):
     def filter(self, record: LogRecord) -> bool:  # noqa: A003
-        try:
-            _ = folder_name_var.get()
-            _ = file_prefix_var.get()
-        except LookupError:
-            res = True
-        else:
-            res = False
-        return res
+        return resolve_record_context(record) is None
 
 
 def set_logger_context(folder_name: str, file_prefix: str) -> None:
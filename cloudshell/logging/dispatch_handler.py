@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+from cloudshell.logging.context_filters import resolve_record_context
+
+HandlersFactory = Callable[[], Iterable[logging.Handler]]
+
+
+class ContextDispatchHandler(logging.Handler):
+    """Route log records to the handlers of the log group from the context.
+
+    Handlers are looked up in a dict by (folder name, file prefix) taken from
+    the logger context, so the cost per record doesn't depend on the number
+    of log groups. Records without context or with an unknown one are skipped.
+    The key is resolved once per record by resolve_record_context().
+
+    A route can be retired to release its handlers, if it has a factory
+    the handlers are recreated on the next record for the route.
+
+    Handlers of removed routes are closed with close_handlers(), records
+    being emitted to them by other threads are written first, later ones
+    are skipped.
+
+    A route can have its own level, it replaces levels of the route's handlers
+    except ones with NOTSET level, so the level of one log group can be changed
+    without changing the handlers.
+    """
+
+    def __init__(self, level: int = logging.NOTSET, max_retired: int = 10000):
+        super().__init__(level=level)
+        self.max_retired = max_retired
+        # routes are replaced as a whole on change, so emit doesn't need a lock
+        self._routes: dict[tuple[str, str], tuple[logging.Handler, ...]] = {}
+        self._factories: dict[tuple[str, str], HandlersFactory] = {}
+        self._retired: OrderedDict[tuple[str, str], HandlersFactory] = OrderedDict()
+        self._last_used: dict[tuple[str, str], float] = {}
+        # levels of routes override levels of their handlers, except NOTSET
+        self._levels: dict[tuple[str, str], int] = {}
+        # handlers of removed routes, threads can still have them in the routes
+        self._closed_handlers: weakref.WeakSet[logging.Handler] = weakref.WeakSet()
+
+    @property
+    def handlers(self) -> list[logging.Handler]:
+        return [h for handlers in self._routes.values() for h in handlers]
+
+    def add_route(
+        self,
+        folder_name: str,
+        file_prefix: str,
+        handlers: Iterable[logging.Handler],
+        factory: HandlersFactory | None = None,
+    ) -> None:
+        key = (folder_name, file_prefix)
+        self.acquire()
+        try:
+            routes = dict(self._routes)
+            routes[key] = tuple(handlers)
+            self._routes = routes
+            if factory is not None:
+                self._factories[key] = factory
+            self._retired.pop(key, None)
+            self._last_used[key] = time.monotonic()
+        finally:
+            self.release()
+
+    def remove_route(
+        self, folder_name: str, file_prefix: str
+    ) -> tuple[logging.Handler, ...]:
+        key = (folder_name, file_prefix)
+        self.acquire()
+        try:
+            routes = dict(self._routes)
+            handlers = routes.pop(key, ())
+            self._routes = routes
+            self._factories.pop(key, None)
+            self._last_used.pop(key, None)
+        finally:
+            self.release()
+        return handlers
+
+    def retire_route(
+        self, folder_name: str, file_prefix: str
+    ) -> tuple[logging.Handler, ...]:
+        """Remove the route but keep its factory to restore it later."""
+        key = (folder_name, file_prefix)
+        self.acquire()
+        try:
+            factory = self._factories.get(key)
+            handlers = self.remove_route(folder_name, file_prefix)
+            if factory is not None:
+                self._retired[key] = factory
+                while len(self._retired) > self.max_retired:
+                    self._retired.popitem(last=False)
+        finally:
+            self.release()
+        return handlers
+
+    def close_handlers(
+        self,
+        handlers: Iterable[logging.Handler],
+        close: Callable[[logging.Handler], None] | None = None,
+    ) -> None:
+        """Close handlers of the removed route after records emitted to them.
+
+        :param close: closes the handler, Handler.close() by default
+        """
+        for hdlr in handlers:
+            hdlr.acquire()
+            try:
+                self._closed_handlers.add(hdlr)
+            finally:
+                hdlr.release()
+            if close is None:
+                hdlr.close()
+            else:
+                close(hdlr)
+
+    def restore_route(self, folder_name: str, file_prefix: str) -> bool:
+        """Recreate handlers of the retired route."""
+        key = (folder_name, file_prefix)
+        self.acquire()
+        try:
+            if key in self._routes:
+                return True
+            factory = self._retired.get(key)
+            if factory is None:
+                return False
+            self.add_route(folder_name, file_prefix, factory(), factory)
+        finally:
+            self.release()
+        return True
+
+    def get_route_keys(self, folder_name: str | None = None) -> list[tuple[str, str]]:
+        """Get keys of active and retired routes of the folder, all by default."""
+        keys = list(self._routes) + list(self._retired)
+        if folder_name is None:
+            return keys
+        return [key for key in keys if key[0] == folder_name]
+
+    def is_retired(self, folder_name: str, file_prefix: str) -> bool:
+        return (folder_name, file_prefix) in self._retired
+
+    def set_factory(
+        self, folder_name: str, file_prefix: str, factory: HandlersFactory | None
+    ) -> None:
+        """Replace the factory of the route, None - forget the retired route."""
+        key = (folder_name, file_prefix)
+        self.acquire()
+        try:
+            if factory is None:
+                self._factories.pop(key, None)
+                self._retired.pop(key, None)
+                return
+            if key in self._routes:
+                self._factories[key] = factory
+            if key in self._retired:
+                self._retired[key] = factory
+        finally:
+            self.release()
+
+    def set_route_level(
+        self, folder_name: str, file_prefix: str, level: int | None
+    ) -> None:
+        """Set level of the route, None - use levels of its handlers.
+
+        The level is kept when the route is retired and restored.
+        """
+        key = (folder_name, file_prefix)
+        self.acquire()
+        try:
+            levels = dict(self._levels)
+            if level is None:
+                levels.pop(key, None)
+            else:
+                levels[key] = level
+            self._levels = levels
+        finally:
+            self.release()
+
+    def get_route_level(self, folder_name: str, file_prefix: str) -> int | None:
+        return self._levels.get((folder_name, file_prefix))
+
+    @property
+    def route_levels(self) -> dict[tuple[str, str], int]:
+        return dict(self._levels)
+
+    def get_handlers(
+        self, folder_name: str, file_prefix: str
+    ) -> tuple[logging.Handler, ...]:
+        return self._routes.get((folder_name, file_prefix), ())
+
+    def touch(self, folder_name: str, file_prefix: str) -> None:
+        key = (folder_name, file_prefix)
+        if key in self._routes:
+            self._last_used[key] = time.monotonic()
+
+    def get_idle_routes(
+        self, idle_timeout: float = 0, max_routes: int = 0
+    ) -> list[tuple[str, str]]:
+        """Get routes not used for idle_timeout seconds or exceeding max_routes.
+
+        Least recently used routes are returned first.
+        """
+        self.acquire()
+        try:
+            routes = self._routes
+            last_used = []
+            # emit updates the times without the lock, iterate over a copy
+            for key, t in list(self._last_used.items()):
+                if key in routes:
+                    last_used.append((t, key))
+                else:
+                    # the route was removed while a record was emitted
+                    self._last_used.pop(key, None)
+        finally:
+            self.release()
+        last_used.sort()
+        excess = len(last_used) - max_routes if max_routes else 0
+        idle_before = time.monotonic() - idle_timeout
+        idle_routes = []
+        for i, (t, key) in enumerate(last_used):
+            if i < excess or (idle_timeout and t <= idle_before):
+                idle_routes.append(key)
+            else:
+                break
+        return idle_routes
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record: logging.LogRecord) -> None:
+        key = resolve_record_context(record)
+        if key is None:
+            return
+        handlers = self._routes.get(key)
+        if handlers is None:
+            if key not in self._retired or not self.restore_route(*key):
+                return
+            handlers = self._routes.get(key, ())
+        self.touch(*key)
+        level = self._levels.get(key)
+        for hdlr in handlers:
+            hdlr_level = hdlr.level
+            if level is not None and hdlr_level != logging.NOTSET:
+                hdlr_level = level
+            if record.levelno >= hdlr_level:
+                hdlr.acquire()
+                try:
+                    # the route could be removed after it was read
+                    if hdlr not in self._closed_handlers:
+                        hdlr.handle(record)
+                finally:
+                    hdlr.release()
+
+    def flush(self) -> None:
+        for hdlr in self.handlers:
+            if getattr(hdlr, "flushOnClose", True):
+                hdlr.flush()
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            handlers = self.handlers
+            self._routes = {}
+            self._factories.clear()
+            self._retired.clear()
+            self._last_used.clear()
+        finally:
+            self.release()
+        for hdlr in handlers:
+            hdlr.close()
+        super().close()
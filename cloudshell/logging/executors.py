@@ -0,0 +1,84 @@
+"""Executors that run every task in the log context of the code submitting it.
+
+pass_log_context() as an initializer passes the context of the code that
+creates the pool, tasks submitted later for other log groups are logged to
+the files of the first one. These executors capture the log context in
+submit(), so one pool can be shared by log groups.
+"""
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import Context, copy_context
+from typing import Callable, Iterable
+
+from cloudshell.logging.context_filters import get_logger_context, set_logger_context
+from cloudshell.logging.forwarding import (
+    RecordListener,
+    forward_loggers,
+    get_logger_levels,
+)
+
+
+class LogContextThreadPoolExecutor(ThreadPoolExecutor):
+    """Thread pool that runs tasks in the context of the submitting code."""
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return super().submit(copy_context().run, fn, *args, **kwargs)
+
+
+def _init_worker(queue, levels, initializer, initargs) -> None:
+    forward_loggers(queue, levels)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _call_in_log_context(log_context, fn, args, kwargs):
+    if log_context is not None:
+        set_logger_context(*log_context)
+    return fn(*args, **kwargs)
+
+
+def _run_in_log_context(log_context, fn, *args, **kwargs):
+    # every task starts with an empty context, tasks don't share it
+    return Context().run(_call_in_log_context, log_context, fn, args, kwargs)
+
+
+class LogContextProcessPoolExecutor(ProcessPoolExecutor):
+    """Process pool that runs tasks in the log context of the submitting code.
+
+    Records of log_categories loggers in the workers are forwarded to the
+    handlers of the parent, so tasks log to the files of their log groups
+    without calling get_qs_logger. Levels of the loggers are taken from the
+    parent when the pool is created.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        mp_context=None,
+        initializer: Callable | None = None,
+        initargs: tuple = (),
+        log_categories: Iterable[str] = ("cloudshell",),
+    ):
+        mp_context = mp_context or multiprocessing.get_context()
+        self._log_queue = mp_context.Queue()
+        self._listener = RecordListener(self._log_queue)
+        levels = get_logger_levels(log_categories)
+        super().__init__(
+            max_workers,
+            mp_context,
+            initializer=_init_worker,
+            initargs=(self._log_queue, levels, initializer, initargs),
+        )
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return super().submit(
+            _run_in_log_context, get_logger_context(), fn, *args, **kwargs
+        )
+
+    def shutdown(self, wait: bool = True, **kwargs) -> None:
+        super().shutdown(wait, **kwargs)
+        if wait:
+            # records of finished workers are in the queue already
+            self._listener.stop()
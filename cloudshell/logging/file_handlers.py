@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import weakref
+from typing import Iterable
+
+from cloudshell.logging.utils.patch_logging_shutdown import (
+    patch_logging_shutdown,
+    register_shutdown_hook,
+)
+
+# handlers that aren't closed yet, their files are kept by the janitor
+_OPEN_HANDLERS: weakref.WeakSet[logging.FileHandler] = weakref.WeakSet()
+
+
+def get_open_files() -> set[str]:
+    """Get paths of files of handlers of the process that aren't closed."""
+    return {hdlr.baseFilename for hdlr in list(_OPEN_HANDLERS)}
+
+
+class CreateDirectoryMixin:
+    """Create the directory of the file when the file is opened.
+
+    Directories aren't created in advance, with delay=True nothing is created
+    until the first record is written. Files of handlers are returned by
+    get_open_files() until the handlers are closed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _OPEN_HANDLERS.add(self)
+
+    def _open(self):
+        try:
+            return super()._open()
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+            return super()._open()
+
+    def close(self) -> None:
+        _OPEN_HANDLERS.discard(self)
+        super().close()
+
+
+class RotatingFileHandler(CreateDirectoryMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class FileHandler(CreateDirectoryMixin, logging.FileHandler):
+    """File handler that can write already formatted records."""
+
+    def write_formatted(self, messages: Iterable[str]) -> None:
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write("".join(msg + self.terminator for msg in messages))
+            self.flush()
+        finally:
+            self.release()
+
+
+class BufferedFileHandler(FileHandler):
+    """File handler that writes formatted records in batches.
+
+    Records are kept in memory and written with one write and flush when
+    flush_bytes are collected, flush_interval milliseconds passed since the
+    first buffered record or a record of flushLevel or above is emitted.
+    """
+
+    def __init__(
+        self,
+        filename: str | os.PathLike,
+        mode: str = "a",
+        encoding: str | None = None,
+        delay: bool = False,
+        flush_bytes: int = 64 * 1024,
+        flush_interval: int = 1000,
+        flushLevel: int = logging.ERROR,
+    ):
+        super().__init__(filename, mode=mode, encoding=encoding, delay=delay)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.flushLevel = flushLevel
+        self._buffer: list[str] = []
+        self._buffered_size = 0
+        self._first_buffered_at = None
+        patch_logging_shutdown()
+        _FLUSHER.register(self)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = self.format(record) + self.terminator
+            self._buffer.append(msg)
+            self._buffered_size += len(msg)
+            if self._first_buffered_at is None:
+                self._first_buffered_at = time.monotonic()
+            if self.shouldFlush(record):
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def write_formatted(self, messages: Iterable[str]) -> None:
+        self.acquire()
+        try:
+            for msg in messages:
+                msg += self.terminator
+                self._buffer.append(msg)
+                self._buffered_size += len(msg)
+            self.flush()
+        finally:
+            self.release()
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (
+            record.levelno >= self.flushLevel
+            or self._buffered_size >= self.flush_bytes
+            or self.is_flush_due()
+        )
+
+    def is_flush_due(self) -> bool:
+        first_buffered_at = self._first_buffered_at
+        return (
+            first_buffered_at is not None
+            and (time.monotonic() - first_buffered_at) * 1000 >= self.flush_interval
+        )
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._buffer:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write("".join(self._buffer))
+                self._buffer.clear()
+                self._buffered_size = 0
+                self._first_buffered_at = None
+            super().flush()
+        finally:
+            self.release()
+
+    def clear_buffer(self) -> None:
+        self._buffer = []
+        self._buffered_size = 0
+        self._first_buffered_at = None
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            _FLUSHER.unregister(self)
+            super().close()
+
+
+class _Flusher:
+    """Background thread that flushes buffered handlers by time.
+
+    Handlers have flush_interval in milliseconds, is_flush_due(), flush() and
+    clear_buffer().
+    """
+
+    def __init__(self):
+        self._handlers: weakref.WeakSet[BufferedFileHandler] = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def register(self, handler: BufferedFileHandler) -> None:
+        with self._lock:
+            self._handlers.add(handler)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="cloudshell-logging-flusher", daemon=True
+                )
+                self._thread.start()
+                register_shutdown_hook(self.flush_all)
+        # new handler can have a shorter interval
+        self._wakeup.set()
+
+    def unregister(self, handler: BufferedFileHandler) -> None:
+        with self._lock:
+            self._handlers.discard(handler)
+
+    def flush_all(self, only_due: bool = False) -> None:
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            if not only_due or handler.is_flush_due():
+                try:
+                    handler.flush()
+                except Exception:
+                    pass
+
+    def _get_check_interval(self) -> float:
+        with self._lock:
+            intervals = [h.flush_interval for h in self._handlers]
+        # check twice per interval, records wait at most 1.5 of it
+        return max(min(intervals, default=1000), 20) / 2000
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self._get_check_interval())
+            self._wakeup.clear()
+            self.flush_all(only_due=True)
+
+    def _restart_after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        for handler in self._handlers:
+            # records buffered before fork are written by the parent
+            handler.clear_buffer()
+        if self._handlers:
+            self.register(next(iter(self._handlers)))
+
+
+_FLUSHER = _Flusher()
+
+
+def get_flusher() -> _Flusher:
+    return _FLUSHER
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_FLUSHER._restart_after_fork)
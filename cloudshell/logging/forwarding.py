@@ -0,0 +1,398 @@
+"""Forward log records of child processes to the handlers of the parent.
+
+Workers of a pool log through a ForwardingHandler that puts records with
+their log context to a multiprocessing queue, the RecordListener thread of
+the parent reads them.
+
+Other child processes find the ForwardingServer of the parent by the
+QS_LOG_FORWARD_ADDRESS environment variable and send records to it in
+batches with a BatchForwardingHandler.
+
+The parent passes received records to its loggers in the log context of the
+child, so they get to the parent's files and memory logs.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing.util
+import os
+import pickle
+import secrets
+import threading
+import time
+from contextvars import Context
+from logging.handlers import QueueHandler
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Callable, Iterable
+
+from cloudshell.logging.context_filters import (
+    resolve_record_context,
+    set_logger_context,
+)
+from cloudshell.logging.file_handlers import get_flusher
+from cloudshell.logging.utils.patch_logging_shutdown import patch_logging_shutdown
+
+# "<pid of the parent>:<address of the server>" and the key of the server
+ADDRESS_ENV = "QS_LOG_FORWARD_ADDRESS"
+AUTHKEY_ENV = "QS_LOG_FORWARD_KEY"
+
+logger = logging.getLogger(__name__)
+
+
+class ForwardingHandler(QueueHandler):
+    """Put records to the queue with the log context of the child."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the prepared record keeps the resolved context
+        resolve_record_context(record)
+        return super().prepare(record)
+
+
+def _handle_in_context(record: logging.LogRecord) -> None:
+    log_context = record.__dict__.get("log_context")
+    if log_context is not None:
+        set_logger_context(*log_context)
+    logging.getLogger(record.name).handle(record)
+
+
+def handle_forwarded_record(record: logging.LogRecord) -> None:
+    """Pass the record to the logger of the parent in the record's log context."""
+    Context().run(_handle_in_context, record)
+
+
+class RecordListener:
+    """Thread that passes records from the queue to the loggers of the process."""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self._thread = threading.Thread(
+            target=self._run, name="cloudshell-logging-listener", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                record = self.queue.get()
+            except (EOFError, OSError):
+                return
+            if record is None:
+                return
+            try:
+                handle_forwarded_record(record)
+            except Exception:
+                logger.exception("Failed to handle forwarded record")
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Handle records left in the queue and stop the thread."""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout)
+
+
+# names of the loggers forwarded by forward_loggers() in the process
+_FORWARDED_LOGGERS: set[str] = set()
+
+
+def forward_loggers(queue, levels: dict[str, int]) -> None:
+    """Replace handlers of the loggers with one forwarding to the parent.
+
+    :param levels: logger name -> level of the logger in the parent
+    """
+    _FORWARDED_LOGGERS.update(levels)
+    handler = ForwardingHandler(queue)
+    for name, level in levels.items():
+        logger = logging.getLogger(name)
+        for hdlr in list(logger.handlers):
+            # handlers and files inherited from the parent aren't used
+            logger.removeHandler(hdlr)
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+
+
+def is_forwarded_logger(name: str) -> bool:
+    """Records of the logger are forwarded to the parent by forward_loggers()."""
+    return any(
+        name == forwarded or name.startswith(f"{forwarded}.")
+        for forwarded in _FORWARDED_LOGGERS
+    )
+
+
+def get_logger_levels(names: Iterable[str]) -> dict[str, int]:
+    return {name: logging.getLogger(name).getEffectiveLevel() for name in names}
+
+
+class ForwardingServer:
+    """Receive batches of records from child processes.
+
+    The address and the key of the server are put to the environment, so
+    child processes started later inherit them.
+    """
+
+    def __init__(self, handle: Callable[[logging.LogRecord], None] | None = None):
+        self.handle = handle or handle_forwarded_record
+        self._authkey = secrets.token_bytes(32)
+        self._listener = Listener(authkey=self._authkey)
+        self.address = self._listener.address
+        self.received = 0
+        self._lock = threading.Lock()
+        threading.Thread(
+            target=self._accept, name="cloudshell-logging-forwarding", daemon=True
+        ).start()
+        os.environ[ADDRESS_ENV] = f"{os.getpid()}:{self.address}"
+        os.environ[AUTHKEY_ENV] = self._authkey.hex()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn = self._listener.accept()
+            except multiprocessing.AuthenticationError:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+
+    def _read(self, conn: Connection) -> None:
+        logged = False
+        try:
+            while True:
+                try:
+                    batch = conn.recv()
+                except (EOFError, OSError):
+                    return
+                except Exception:
+                    # e.g. a class of the child isn't importable here, the
+                    # batch is read whole, so the next batches can be read
+                    if not logged:
+                        logger.exception("Failed to unpickle forwarded records")
+                        logged = True
+                    continue
+                with self._lock:
+                    self.received += len(batch)
+                for record in batch:
+                    try:
+                        self.handle(record)
+                    except Exception:
+                        logger.exception("Failed to handle forwarded record")
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        self._listener.close()
+        if os.environ.get(ADDRESS_ENV) == f"{os.getpid()}:{self.address}":
+            del os.environ[ADDRESS_ENV]
+            del os.environ[AUTHKEY_ENV]
+
+
+_SERVER: ForwardingServer | None = None
+_SERVER_LOCK = threading.Lock()
+
+
+def start_forwarding_server(
+    handle: Callable[[logging.LogRecord], None] | None = None
+) -> ForwardingServer:
+    """Start the server of the process if it isn't running.
+
+    Child processes started after it forward their records to the process.
+    """
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            _SERVER = ForwardingServer(handle)
+        return _SERVER
+
+
+def stop_forwarding_server() -> None:
+    global _SERVER
+    with _SERVER_LOCK:
+        server, _SERVER = _SERVER, None
+    if server is not None:
+        server.close()
+
+
+def get_parent_address() -> tuple[str, bytes] | None:
+    """Get address and key of the server of the parent process.
+
+    :return: None if the process isn't a child of a forwarding process
+    """
+    value = os.environ.get(ADDRESS_ENV)
+    authkey = os.environ.get(AUTHKEY_ENV)
+    if not value or not authkey:
+        return None
+    pid, _, address = value.partition(":")
+    if pid == str(os.getpid()):
+        return None  # it's the server of this process
+    return address, bytes.fromhex(authkey)
+
+
+def is_forwarding_child() -> bool:
+    return get_parent_address() is not None
+
+
+def _clear_server_after_fork() -> None:
+    # the child forwards records to the parent, it doesn't serve
+    global _SERVER, _SERVER_LOCK
+    _SERVER_LOCK = threading.Lock()
+    _SERVER = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_clear_server_after_fork)
+
+
+_EXIT_FLUSH_PID = None
+
+
+def _register_exit_flush() -> None:
+    # forked processes of multiprocessing exit without atexit handlers,
+    # but they run finalizers registered in the process
+    global _EXIT_FLUSH_PID
+    if _EXIT_FLUSH_PID != os.getpid():
+        _EXIT_FLUSH_PID = os.getpid()
+        multiprocessing.util.Finalize(None, get_flusher().flush_all, exitpriority=10)
+
+
+def _make_picklable(record: logging.LogRecord) -> logging.LogRecord:
+    for name, value in list(record.__dict__.items()):
+        try:
+            pickle.dumps(value)
+        except Exception:
+            record.__dict__[name] = repr(value)
+    return record
+
+
+class BatchForwardingHandler(logging.Handler):
+    """Send records to the server of the parent process in batches.
+
+    Records are sent when batch_size records are collected, flush_interval
+    milliseconds passed since the first buffered record or a record of
+    flushLevel or above is emitted. Records are dropped if the parent isn't
+    available.
+    """
+
+    # records of all levels are sent, the parent keeps debug records in its
+    # memory logs, levels of the config aren't set to the handler
+    forward_all_levels = False
+
+    def __init__(
+        self,
+        address: str,
+        authkey: bytes,
+        batch_size: int = 100,
+        flush_interval: int = 200,
+        flushLevel: int = logging.ERROR,
+        level: int = logging.NOTSET,
+    ):
+        super().__init__(level=level)
+        self.address = address
+        self.authkey = authkey
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flushLevel = flushLevel
+        self.dropped = 0
+        self._buffer: list[logging.LogRecord] = []
+        self._first_buffered_at = None
+        self._conn = None
+        self._pid = None
+        patch_logging_shutdown()
+        get_flusher().register(self)
+        _register_exit_flush()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Copy the record without objects that can't be sent."""
+        attrs = dict(record.__dict__)
+        attrs.pop("_qs_format_cache", None)
+        attrs["msg"] = record.getMessage()
+        attrs["args"] = None
+        if record.exc_info:
+            if not record.exc_text:
+                attrs["exc_text"] = self.format_exception(record)
+            attrs["exc_info"] = None
+        attrs["log_context"] = resolve_record_context(record)
+        return logging.makeLogRecord(attrs)
+
+    def format_exception(self, record: logging.LogRecord) -> str:
+        formatter = self.formatter or logging._defaultFormatter
+        return formatter.formatException(record.exc_info)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._buffer.append(self.prepare(record))
+            if self._first_buffered_at is None:
+                self._first_buffered_at = time.monotonic()
+            if self.shouldFlush(record):
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (
+            record.levelno >= self.flushLevel
+            or len(self._buffer) >= self.batch_size
+            or self.is_flush_due()
+        )
+
+    def is_flush_due(self) -> bool:
+        first_buffered_at = self._first_buffered_at
+        return (
+            first_buffered_at is not None
+            and (time.monotonic() - first_buffered_at) * 1000 >= self.flush_interval
+        )
+
+    def _connect(self) -> Connection:
+        if self._conn is None or self._pid != os.getpid():
+            # the connection of the parent process isn't used after fork
+            self._conn = Client(self.address, authkey=self.authkey)
+            self._pid = os.getpid()
+        return self._conn
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if not self._buffer:
+                return
+            batch = self._buffer
+            self._buffer = []
+            self._first_buffered_at = None
+            try:
+                self._send(batch)
+            except (OSError, multiprocessing.AuthenticationError):
+                self.dropped += len(batch)
+                self._close_connection()
+        finally:
+            self.release()
+
+    def _send(self, batch: list[logging.LogRecord]) -> None:
+        conn = self._connect()
+        try:
+            conn.send(batch)
+        except OSError:
+            raise
+        except Exception:
+            # the batch is pickled before it's sent, records with extra
+            # attributes that can't be pickled are sent with their repr()
+            conn.send([_make_picklable(record) for record in batch])
+
+    def clear_buffer(self) -> None:
+        self._buffer = []
+        self._first_buffered_at = None
+
+    def _close_connection(self) -> None:
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            get_flusher().unregister(self)
+            self.acquire()
+            try:
+                self._close_connection()
+                super().close()
+            finally:
+                self.release()
@@ -0,0 +1,368 @@
+"""Retention of log files in the log directory.
+
+Log files are kept in LOG_PATH/<reservation>/<venv>/ directories. The janitor
+compresses and deletes the oldest files to keep the age and size quotas of
+the whole log directory and of every reservation directory. It processes
+one reservation directory per step, so it can run in the background without
+long directory walks.
+
+Files of open handlers of the process and files modified in the last
+active_time seconds aren't touched. Files held open by other processes and
+files written by the shared writer are recognized only by the modification
+time. One process at a time cleans the log directory, it holds the lock file
+of the directory in the runtime directory of the user.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Iterable, NamedTuple
+
+from cloudshell.logging.file_handlers import get_open_files
+from cloudshell.logging.rotation import Compression, compress_file
+from cloudshell.logging.utils.file_lock import get_runtime_dir, try_lock_file
+
+DAY = 24 * 60 * 60
+# files modified recently can be used by handlers, they are not touched
+DEFAULT_ACTIVE_TIME = 60
+# pause between steps of the background janitor
+STEP_PAUSE = 0.1
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+
+logger = logging.getLogger(__name__)
+
+
+class FileInfo(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+
+
+def _is_log_file(name: str) -> bool:
+    return ".log" in name and not name.endswith(".tmp")
+
+
+def _get_lock_path(root: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(get_runtime_dir(), f"cloudshell-logging-janitor-{digest}.lock")
+
+
+class Janitor:
+    """Keep age and size quotas of the log directory.
+
+    :param root: log directory with reservation directories
+    :param max_age: seconds to keep files, 0 - no limit
+    :param max_bytes: size of all files in the root, 0 - no limit
+    :param reservation_max_bytes: size of files of a reservation, 0 - no limit
+    :param compress_after: compress files older than seconds, 0 - never
+    :param compression: gzip or zstd
+    :param active_time: files modified in the last seconds are not touched
+    :param get_open_files: returns paths of files used by the process,
+        files of open handlers by default
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_age: float = 0,
+        max_bytes: int = 0,
+        reservation_max_bytes: int = 0,
+        compress_after: float = 0,
+        compression: str = Compression.GZIP,
+        active_time: float = DEFAULT_ACTIVE_TIME,
+        get_open_files: Callable[[], Iterable[str]] = get_open_files,
+    ):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.reservation_max_bytes = reservation_max_bytes
+        self.compress_after = compress_after
+        self.compression = compression
+        self.active_time = active_time
+        self.get_open_files = get_open_files
+        self.stats = Counter()
+        # reservation directories left in the current round, "" is the root
+        self._pending: deque[str] = deque()
+        # files of the reservation directories found on the last scan
+        self._files: dict[str, list[FileInfo]] = {}
+        # absolute paths of files used by the process, updated every step
+        self._open_files: set[str] = set()
+        self._root_lock = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        quotas = (
+            self.max_age,
+            self.max_bytes,
+            self.reservation_max_bytes,
+            self.compress_after,
+        )
+        return any(quotas)
+
+    @property
+    def locked(self) -> bool:
+        """The janitor holds the lock of the directory."""
+        return self._root_lock is not None
+
+    def run(self) -> Counter:
+        """Process the whole log directory, return stats of the janitor.
+
+        :raises BlockingIOError: another process cleans the directory
+        """
+        with self._lock:
+            self._pending.clear()
+        while not self.step(max_dirs=100):
+            pass
+        if not self.locked:
+            raise BlockingIOError(f"{self.root} is cleaned by another process")
+        return self.stats
+
+    def step(self, max_dirs: int = 1) -> bool:
+        """Process next reservation directories.
+
+        Root quota is applied at the end of the round. Nothing is done if
+        another process cleans the directory, see locked.
+        :return: True if the round is finished or the directory is locked
+        """
+        with self._lock:
+            if not self._lock_root():
+                return True
+            self._open_files = {os.path.abspath(p) for p in self.get_open_files()}
+            if not self._pending:
+                self._start_round()
+            for _ in range(max_dirs):
+                if not self._pending:
+                    break
+                name = self._pending.popleft()
+                self._files[name] = self._clean_reservation(name)
+            if self._pending:
+                return False
+            self._apply_root_quota()
+            self.stats["rounds"] += 1
+            return True
+
+    def _lock_root(self) -> bool:
+        """Lock the directory for the life of the janitor."""
+        if self._root_lock is None:
+            try:
+                self._root_lock = try_lock_file(_get_lock_path(self.root))
+            except OSError:
+                logger.exception("Failed to lock log directory %s", self.root)
+        return self._root_lock is not None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._root_lock is not None:
+                self._root_lock.close()
+                self._root_lock = None
+
+    def _start_round(self) -> None:
+        names = [""]
+        try:
+            with os.scandir(self.root) as it:
+                names.extend(entry.name for entry in it if entry.is_dir())
+        except OSError:
+            pass
+        self._pending.extend(names)
+        for name in set(self._files) - set(names):
+            del self._files[name]
+
+    def _scan(self, name: str) -> list[FileInfo]:
+        files = []
+        path = os.path.join(self.root, name) if name else self.root
+        if name:
+            walk = os.walk(path)
+        else:
+            # only files in the root, directories are reservations
+            with os.scandir(path) as it:
+                walk = [(path, [], [entry.name for entry in it if entry.is_file()])]
+        for dir_path, _, file_names in walk:
+            for file_name in file_names:
+                if not _is_log_file(file_name):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                files.append(FileInfo(file_path, st.st_size, st.st_mtime))
+        files.sort(key=lambda f: f.mtime)
+        return files
+
+    def _is_active(self, info: FileInfo, now: float) -> bool:
+        if now - info.mtime < self.active_time:
+            return True
+        return os.path.abspath(info.path) in self._open_files
+
+    def _clean_reservation(self, name: str) -> list[FileInfo]:
+        try:
+            files = self._scan(name)
+        except OSError:
+            return []
+        now = time.time()
+        kept = []
+        for info in files:
+            age = now - info.mtime
+            if self._is_active(info, now):
+                kept.append(info)
+            elif self.max_age and age > self.max_age:
+                self._delete(info)
+            elif (
+                self.compress_after
+                and age > self.compress_after
+                and not info.path.endswith(COMPRESSED_EXTENSIONS)
+            ):
+                kept.append(self._compress(info))
+            else:
+                kept.append(info)
+        if self.reservation_max_bytes:
+            kept = self._apply_quota(kept, self.reservation_max_bytes, now)
+        if name:
+            self._remove_empty_dirs(os.path.join(self.root, name), now)
+        return kept
+
+    def _apply_quota(
+        self, files: list[FileInfo], max_bytes: int, now: float
+    ) -> list[FileInfo]:
+        """Delete the oldest files above the quota, files are sorted by mtime."""
+        total = sum(info.size for info in files)
+        kept = []
+        for info in files:
+            if total > max_bytes and not self._is_active(info, now):
+                self._delete(info)
+                total -= info.size
+            else:
+                kept.append(info)
+        return kept
+
+    def _apply_root_quota(self) -> None:
+        if not self.max_bytes:
+            return
+        files = sorted(
+            (info for files in self._files.values() for info in files),
+            key=lambda f: f.mtime,
+        )
+        kept = set(self._apply_quota(files, self.max_bytes, time.time()))
+        for name, files in self._files.items():
+            self._files[name] = [info for info in files if info in kept]
+
+    def _delete(self, info: FileInfo) -> None:
+        try:
+            os.remove(info.path)
+        except OSError:
+            return
+        self.stats["deleted"] += 1
+        self.stats["freed_bytes"] += info.size
+
+    def _compress(self, info: FileInfo) -> FileInfo:
+        try:
+            path = compress_file(info.path, self.compression)
+            os.utime(path, (info.mtime, info.mtime))
+            size = os.path.getsize(path)
+        except OSError:
+            logger.exception("Failed to compress %s", info.path)
+            return info
+        self.stats["compressed"] += 1
+        self.stats["freed_bytes"] += info.size - size
+        return FileInfo(path, size, info.mtime)
+
+    def _remove_empty_dirs(self, path: str, now: float) -> None:
+        for dir_path, dir_names, file_names in os.walk(path, topdown=False):
+            if file_names:
+                continue
+            try:
+                if now - os.path.getmtime(dir_path) >= self.active_time:
+                    os.rmdir(dir_path)
+            except OSError:
+                pass
+
+
+_THREADS: dict[str, threading.Thread] = {}
+_THREADS_LOCK = threading.Lock()
+
+
+def _run_in_background(janitor: Janitor, interval: float) -> None:
+    while True:
+        try:
+            finished = janitor.step()
+        except Exception:
+            logger.exception("Failed to clean log directory %s", janitor.root)
+            finished = True
+        time.sleep(interval if finished else STEP_PAUSE)
+
+
+def start_janitor(janitor: Janitor, interval: float) -> bool:
+    """Run the janitor in the background thread, one thread per log directory.
+
+    :return: False if the janitor of the directory is already running
+    """
+    root = os.path.abspath(janitor.root)
+    with _THREADS_LOCK:
+        if root in _THREADS:
+            return False
+        thread = threading.Thread(
+            target=_run_in_background,
+            args=(janitor, interval),
+            name="cloudshell-logging-janitor",
+            daemon=True,
+        )
+        _THREADS[root] = thread
+        thread.start()
+        return True
+
+
+def _clear_threads_after_fork() -> None:
+    global _THREADS_LOCK
+    _THREADS_LOCK = threading.Lock()
+    _THREADS.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_clear_threads_after_fork)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Clean the log directory, defaults are taken from qs_config.ini."""
+    from cloudshell.logging.qs_logger import get_janitor
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("root", nargs="?", help="log directory, LOG_PATH by default")
+    parser.add_argument("--max-age-days", type=float)
+    parser.add_argument("--max-bytes", type=int)
+    parser.add_argument("--reservation-max-bytes", type=int)
+    parser.add_argument("--compress-after-days", type=float)
+    parser.add_argument("--compression", choices=(Compression.GZIP, Compression.ZSTD))
+    args = parser.parse_args(argv)
+
+    janitor = get_janitor(root=args.root)
+    if janitor is None:
+        parser.error("log directory is not configured")
+    if args.max_age_days is not None:
+        janitor.max_age = args.max_age_days * DAY
+    if args.max_bytes is not None:
+        janitor.max_bytes = args.max_bytes
+    if args.reservation_max_bytes is not None:
+        janitor.reservation_max_bytes = args.reservation_max_bytes
+    if args.compress_after_days is not None:
+        janitor.compress_after = args.compress_after_days * DAY
+    if args.compression:
+        janitor.compression = args.compression
+
+    try:
+        stats = janitor.run()
+    except BlockingIOError as e:
+        parser.exit(1, f"{parser.prog}: {e}\n")
+    print(  # noqa: T201
+        f"deleted {stats['deleted']} files, compressed {stats['compressed']} files, "
+        f"freed {stats['freed_bytes']} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,31 @@
 from __future__ import annotations
 
+import itertools
 import logging
+import threading
+import weakref
 from collections import deque
+from typing import Any, Mapping, NamedTuple
+
+# approximate size of LogRecord object with its attributes
+RECORD_OVERHEAD = 512
+# approximate size of compact entry without its strings
+ENTRY_OVERHEAD = 256
+
+
+def get_record_size(record: logging.LogRecord) -> int:
+    """Approximate memory taken by the record and its message."""
+    size = RECORD_OVERHEAD
+    msg = record.msg
+    if isinstance(msg, (str, bytes)):
+        size += len(msg)
+    args = record.args
+    if args:
+        if isinstance(args, Mapping):
+            args = args.values()
+        for arg in args:
+            size += len(arg) if isinstance(arg, (str, bytes)) else 16
+    return size
 
 
 class LimitedMemoryHandler(logging.Handler):
@@ -12,6 +36,7 @@ class LimitedMemoryHandler(logging.Handler):
         flushLevel: int = logging.ERROR,
         flushOnClose: bool = False,
         level: int = logging.NOTSET,
+        budget: MemoryBudget | None = None,
     ):
         super().__init__(level=level)
         self.max_len = max_len
@@ -19,18 +44,68 @@ class LimitedMemoryHandler(logging.Handler):
         self.target = target
         self.flushOnClose = flushOnClose
         self.buffer = deque(maxlen=max_len)
+        self.budget = budget
+        # size of buffered entries, it's tracked if the budget is used
+        self.buffer_size = 0
+        # number of entries evicted because of the budget
+        self.evicted = 0
+        # number of entries dropped without being flushed, they weren't formatted
+        self.discarded = 0
+        self._sizes = deque()  # (seq, size) of buffered entries
 
     def change_max_len(self, max_len: int) -> None:
         self.acquire()
         try:
             if self.max_len != max_len:
                 self.max_len = max_len
-                self.buffer = deque(self.buffer, maxlen=max_len)
+                if self.budget is None:
+                    self._resize(max_len)
+                else:
+                    self.budget.resize(self, max_len)
         finally:
             self.release()
 
+    def _push(self, entry: Any, size: int, seq: int | None = None) -> None:
+        self.buffer.append(entry)
+        self._sizes.append((seq, size))
+        self.buffer_size += size
+
+    def _pop_oldest(self) -> int:
+        self.discarded += 1
+        self.buffer.popleft()
+        _, size = self._sizes.popleft()
+        self.buffer_size -= size
+        return size
+
+    def _resize(self, max_len: int) -> int:
+        removed = 0
+        if self._sizes:
+            while len(self.buffer) > max_len:
+                removed += self._pop_oldest()
+        else:
+            self.discarded += max(len(self.buffer) - max_len, 0)
+        self.buffer = deque(self.buffer, maxlen=max_len)
+        return removed
+
+    def _clear(self) -> list:
+        entries = list(self.buffer)
+        self.buffer.clear()
+        self._sizes.clear()
+        self.buffer_size = 0
+        return entries
+
+    def _take_buffer(self) -> list:
+        if self.budget is None:
+            return self._clear()
+        return self.budget.take(self)
+
     def emit(self, record: logging.LogRecord) -> None:
-        self.buffer.append(record)
+        if self.budget is None:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.discarded += 1
+            self.buffer.append(record)
+        else:
+            self.budget.append(self, record, get_record_size(record))
         if self.shouldFlush(record):
             self.flush()
 
@@ -41,9 +116,8 @@ class LimitedMemoryHandler(logging.Handler):
         self.acquire()
         try:
             if self.target:
-                for record in self.buffer:
+                for record in self._take_buffer():
                     self.target.handle(record)
-                self.buffer.clear()
         finally:
             self.release()
 
@@ -54,7 +128,243 @@ class LimitedMemoryHandler(logging.Handler):
         finally:
             self.acquire()
             try:
+                self.discarded += len(self._take_buffer())
                 self.target = None
                 super().close()
             finally:
                 self.release()
+
+
+# args of these types are kept in the buffer, others are interpolated
+IMMUTABLE_ARG_TYPES = (str, bytes, int, float, bool, type(None))
+# shared tuples of record attribute names
+_RECORD_KEYS: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+
+class MemoryEntry(NamedTuple):
+    levelno: int
+    keys: tuple[str, ...]
+    values: tuple
+
+    def to_record(self) -> logging.LogRecord:
+        return logging.makeLogRecord(dict(zip(self.keys, self.values)))
+
+
+class CompactMemoryHandler(LimitedMemoryHandler):
+    """Keep records as compact unformatted entries instead of LogRecord objects.
+
+    Entries don't hold exception info and mutable args of the records, they
+    are formatted only when they are flushed, so dropped entries cost no
+    formatting. The buffer is limited by max_len entries and approximate
+    max_bytes bytes, the oldest entries are dropped first. Records are
+    formatted with the handler's formatter or with the target's one.
+    """
+
+    # attributes of records that aren't kept in the buffer
+    SKIP_ATTRS = frozenset({"_qs_format_cache"})
+
+    def __init__(
+        self,
+        max_len: int,
+        target: logging.Handler,
+        max_bytes: int = 1024 * 1024,
+        flushLevel: int = logging.ERROR,
+        flushOnClose: bool = False,
+        level: int = logging.NOTSET,
+        budget: MemoryBudget | None = None,
+    ):
+        super().__init__(
+            max_len,
+            target,
+            flushLevel=flushLevel,
+            flushOnClose=flushOnClose,
+            level=level,
+            budget=budget,
+        )
+        self.max_bytes = max_bytes
+
+    def _get_formatter(self) -> logging.Formatter:
+        if self.formatter is None and self.target is not None:
+            formatter = self.target.formatter
+            if formatter is not None:
+                return formatter
+        return self.formatter or logging._defaultFormatter
+
+    def format(self, record: logging.LogRecord) -> str:  # noqa: A003
+        return self._get_formatter().format(record)
+
+    def _make_entry(self, record: logging.LogRecord) -> tuple[MemoryEntry, int]:
+        attrs = {k: v for k, v in record.__dict__.items() if k not in self.SKIP_ATTRS}
+        size = ENTRY_OVERHEAD
+        args = record.args
+        if args:
+            values = args.values() if isinstance(args, Mapping) else args
+            if all(isinstance(arg, IMMUTABLE_ARG_TYPES) for arg in values):
+                for arg in values:
+                    size += len(arg) if isinstance(arg, (str, bytes)) else 16
+            else:
+                attrs["msg"] = record.getMessage()
+                attrs["args"] = None
+        if record.exc_info:
+            if not record.exc_text:
+                attrs["exc_text"] = self._get_formatter().formatException(
+                    record.exc_info
+                )
+            attrs["exc_info"] = None
+        for key in ("msg", "exc_text", "stack_info"):
+            value = attrs.get(key)
+            if isinstance(value, str):
+                size += len(value)
+        keys = tuple(attrs)
+        keys = _RECORD_KEYS.setdefault(keys, keys)
+        return MemoryEntry(record.levelno, keys, tuple(attrs.values())), size
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            entry, size = self._make_entry(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if size > self.max_bytes or self.buffer.maxlen == 0:
+            self.discarded += 1
+        elif self.budget is None:
+            if len(self.buffer) == self.buffer.maxlen:
+                self._pop_oldest()
+            self._push(entry, size)
+            while self.buffer_size > self.max_bytes:
+                self._pop_oldest()
+        else:
+            self.budget.append(self, entry, size)
+            while self.buffer_size > self.max_bytes:
+                self.budget.remove_oldest(self)
+
+        if self.shouldFlush(record):
+            self.flush()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self.target and self.buffer:
+                records = [entry.to_record() for entry in self._take_buffer()]
+                write_formatted = getattr(self.target, "write_formatted", None)
+                if write_formatted is not None:
+                    write_formatted([self.format(record) for record in records])
+                else:
+                    for record in records:
+                        self.target.handle(record)
+        finally:
+            self.release()
+
+
+class MemoryBudget:
+    """Limit of bytes kept by all memory handlers sharing the budget.
+
+    When the limit is exceeded the oldest entries are evicted, regardless of
+    the handler they belong to. All buffer changes of the handlers are made
+    under the budget lock.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.usage = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        # (handler ref, seq) in order of appending, entries removed from the
+        # handlers are skipped on eviction and dropped on compaction
+        self._order = deque()
+        self._entries = 0
+        self._handlers: weakref.WeakSet[LimitedMemoryHandler] = weakref.WeakSet()
+
+    def append(self, handler: LimitedMemoryHandler, entry: Any, size: int) -> None:
+        with self._lock:
+            if handler.buffer.maxlen == 0:
+                handler.discarded += 1
+                return
+            if len(handler.buffer) == handler.buffer.maxlen:
+                self._remove_oldest(handler)
+            seq = next(self._seq)
+            handler._push(entry, size, seq)
+            self._handlers.add(handler)
+            self._order.append((weakref.ref(handler), seq))
+            self._entries += 1
+            self.usage += size
+            while self.usage > self.max_bytes and self._evict_oldest():
+                pass
+            if len(self._order) > 2 * self._entries + 1024:
+                self._compact()
+
+    def remove_oldest(self, handler: LimitedMemoryHandler) -> None:
+        with self._lock:
+            self._remove_oldest(handler)
+
+    def _remove_oldest(self, handler: LimitedMemoryHandler) -> None:
+        self.usage -= handler._pop_oldest()
+        self._entries -= 1
+
+    def _evict_oldest(self) -> bool:
+        while self._order:
+            ref, seq = self._order.popleft()
+            handler = ref()
+            if handler is not None and handler._sizes and handler._sizes[0][0] == seq:
+                self._remove_oldest(handler)
+                handler.evicted += 1
+                self.evicted += 1
+                return True
+        return False
+
+    def _compact(self) -> None:
+        order = deque()
+        for ref, seq in self._order:
+            handler = ref()
+            if handler is not None and handler._sizes:
+                if seq >= handler._sizes[0][0]:
+                    order.append((ref, seq))
+        self._order = order
+
+    def take(self, handler: LimitedMemoryHandler) -> list:
+        """Remove all entries from the handler's buffer and return them."""
+        with self._lock:
+            self.usage -= handler.buffer_size
+            self._entries -= len(handler.buffer)
+            return handler._clear()
+
+    def resize(self, handler: LimitedMemoryHandler, max_len: int) -> None:
+        with self._lock:
+            removed_entries = max(len(handler.buffer) - max_len, 0)
+            self.usage -= handler._resize(max_len)
+            self._entries -= removed_entries
+
+    def get_stats(self) -> dict:
+        """Get current usage and number of evicted entries per handler."""
+        with self._lock:
+            handlers = {}
+            for handler in self._handlers:
+                handlers[handler.get_name() or repr(handler)] = {
+                    "usage": handler.buffer_size,
+                    "evicted": handler.evicted,
+                    "discarded": handler.discarded,
+                }
+            return {
+                "max_bytes": self.max_bytes,
+                "usage": self.usage,
+                "evicted": self.evicted,
+                "handlers": handlers,
+            }
+
+
+_BUDGET: MemoryBudget | None = None
+_BUDGET_LOCK = threading.Lock()
+
+
+def get_memory_budget(max_bytes: int) -> MemoryBudget:
+    """Get the budget shared by memory handlers of the process.
+
+    The limit is updated if it's changed.
+    """
+    global _BUDGET
+    with _BUDGET_LOCK:
+        if _BUDGET is None:
+            _BUDGET = MemoryBudget(max_bytes)
+        _BUDGET.max_bytes = max_bytes
+        return _BUDGET
@@ -2,6 +2,12 @@ import configparser as ConfigParser
 import os
 
 DEFAULT_CONFIG_PATH = "qs_config.ini"
+_DEFAULT_CONFIG_FULL_PATH = os.path.join(os.path.dirname(__file__), DEFAULT_CONFIG_PATH)
+
+
+def get_config_path():
+    """Get path to the config file from QS_CONFIG or the default one."""
+    return os.getenv("QS_CONFIG", _DEFAULT_CONFIG_FULL_PATH)
 
 
 class QSConfigParser:
@@ -11,9 +17,7 @@ class QSConfigParser:
         self._config_parser = ConfigParser.RawConfigParser()
 
     def _get_full_config(self):
-        config_file = os.getenv(
-            "QS_CONFIG", os.path.join(os.path.dirname(__file__), DEFAULT_CONFIG_PATH)
-        )
+        config_file = get_config_path()
         config_dict = {}
         try:
             self._config_parser.read(config_file)
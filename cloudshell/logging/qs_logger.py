@@ -1,24 +1,52 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
 import re
+import stat
 import sys
 import threading
 import time
 import traceback
+from collections import Counter
 from datetime import datetime
-from functools import wraps
-from logging.handlers import RotatingFileHandler
+from functools import partial, wraps
 from pathlib import Path
 
+from cloudshell.logging.async_handler import AsyncHandler, get_async_writer
+from cloudshell.logging.config_watcher import start_config_watcher
 from cloudshell.logging.context_filters import (
-    FilterByContext,
     FilterOnlyWithoutContext,
+    ResolveContextFilter,
+    resolve_record_context,
     set_logger_context,
 )
-from cloudshell.logging.memory_handler import LimitedMemoryHandler
-from cloudshell.logging.qs_config_parser import QSConfigParser
+from cloudshell.logging.dispatch_handler import ContextDispatchHandler, HandlersFactory
+from cloudshell.logging.file_handlers import (
+    BufferedFileHandler,
+    FileHandler,
+    RotatingFileHandler,
+)
+from cloudshell.logging.forwarding import (
+    BatchForwardingHandler,
+    get_parent_address,
+    handle_forwarded_record,
+    is_forwarded_logger,
+    is_forwarding_child,
+    start_forwarding_server,
+)
+from cloudshell.logging.janitor import DAY, DEFAULT_ACTIVE_TIME, Janitor, start_janitor
+from cloudshell.logging.memory_handler import (
+    CompactMemoryHandler,
+    LimitedMemoryHandler,
+    get_memory_budget,
+)
+from cloudshell.logging.qs_config_parser import QSConfigParser, get_config_path
+from cloudshell.logging.rate_limit import RateLimitFilter, parse_limits
+from cloudshell.logging.rotation import RollingFileHandler
+from cloudshell.logging.settings_cache import SettingsCache
+from cloudshell.logging.shared_writer import DEFAULT_IDLE_TIMEOUT, SharedFileHandler
 from cloudshell.logging.utils.log_exec_info import log_execution_info
 from cloudshell.logging.utils.patch_logging_shutdown import patch_logging_shutdown
 from cloudshell.logging.utils.venv import get_venv_name
@@ -44,12 +72,26 @@ DEFAULT_LEVEL = "INFO"
 DEFAULT_PRIORITY = "ENV"
 LOG_SECTION = "Logging"
 WINDOWS_OS_FAMILY = "nt"
+# settings are re-read when one of these environment variables is changed
+SETTINGS_ENV_VARS = ("LOG_LEVEL", "LOG_PATH", "QS_MEMORY_LOG_SIZE", "QS_CONFIG")
 
 _LOGGER_CONTAINER = {}
 _LOGGER_LOCK = threading.Lock()
-
-
-def get_settings():
+# settings applied to the loggers by name, they are re-applied on change
+_APPLIED_SETTINGS = {}
+# log path settings the loggers' files were opened with by name
+_LOG_PATHS = {}
+_FORMATTERS = {}
+# log directories verified to be writable, path -> time.monotonic() of the check
+_WRITABLE_DIRS = {}
+WRITABLE_DIR_TTL = 60
+MISSING_LOGS_NAME = "missed_logs.log"
+# "formatted" records (each of them is normalized) and formatting results
+# "reused" from the records, records that are dropped never get here
+FORMAT_STATS = Counter()
+
+
+def _read_settings():
     """Read configuration settings from config or use DEFAULTS.
 
     :return: config obj
@@ -75,8 +117,102 @@ def get_settings():
     return config
 
 
-def set_log_level(logger: logging.Logger, level: int):
+def _get_config_value(config, key, default=None):
+    """Get config value, QS_<KEY> environment variable overrides it."""
+    return os.getenv(f"QS_{key}", config.get(key, default))
+
+
+def _get_bool_config_value(config, key, default=False) -> bool:
+    value = _get_config_value(config, key)
+    if value is None:
+        return default
+    return str(value).strip().lower() in ("true", "yes", "on", "1")
+
+
+_SETTINGS_CACHE = SettingsCache(_read_settings, get_config_path, SETTINGS_ENV_VARS)
+
+
+def get_settings():
+    """Get configuration settings from config or use DEFAULTS.
+
+    Settings are cached and re-read only when the config file or one of
+    SETTINGS_ENV_VARS is changed.
+
+    :return: config obj
+    """
+    return _SETTINGS_CACHE.get()
+
+
+def invalidate_settings():
+    """Drop cached settings, they will be re-read on the next get_settings()."""
+    _SETTINGS_CACHE.invalidate()
+
+
+def _iter_handlers(logger: logging.Logger):
+    """Iterate over logger's handlers including ones routed by context."""
     for handler in logger.handlers:
+        if isinstance(handler, ContextDispatchHandler):
+            yield from handler.handlers
+        else:
+            yield handler
+
+
+def set_log_level(logger: logging.Logger, level: int):
+    """Set level of the logger's handlers, log group levels are kept."""
+    _set_handlers_level(_iter_handlers(logger), level)
+    _update_logger_level(logger)
+
+
+def set_log_group_level(
+    log_group: str,
+    level: int | str | None,
+    log_category: str = "cloudshell",
+    log_file_prefix: str | None = None,
+) -> None:
+    """Set level of the log group, it overrides the level from the config.
+
+    :param level: None - use the level from the config again
+    :param log_file_prefix: files of the group with the prefix, all by default
+    """
+    logger = logging.getLogger(log_category)
+    if level is not None:
+        level = logging._checkLevel(level)
+    dispatcher = _get_dispatch_handler(logger)
+    if log_file_prefix is None:
+        keys = dispatcher.get_route_keys(log_group)
+    else:
+        keys = [(log_group, log_file_prefix)]
+    for key in keys:
+        dispatcher.set_route_level(*key, level)
+    _update_logger_level(logger)
+
+
+def _get_handler_threshold(handler: logging.Handler) -> int | None:
+    if isinstance(handler, LimitedMemoryHandler) and handler.max_len == 0:
+        return None  # it doesn't keep records
+    return handler.level or logging.DEBUG
+
+
+def _update_logger_level(logger: logging.Logger) -> None:
+    """Set the logger level to the lowest level of its handlers and log groups.
+
+    Records below all levels are rejected by the logger before they are
+    created.
+    """
+    thresholds = [_get_handler_threshold(h) for h in _iter_handlers(logger)]
+    dispatcher = _find_dispatch_handler(logger)
+    if dispatcher is not None:
+        thresholds.extend(dispatcher.route_levels.values())
+    level = min(filter(None, thresholds), default=logging.DEBUG)
+    level = max(level, logging.DEBUG)
+    if logger.level != level:
+        logger.setLevel(level)
+
+
+def _set_handlers_level(handlers, level):
+    for handler in handlers:
+        if getattr(handler, "forward_all_levels", False):
+            continue
         if not isinstance(handler, LimitedMemoryHandler):
             try:
                 handler.setLevel(level)
@@ -89,6 +225,72 @@ def set_log_level_from_config(logger, config):
     set_log_level(logger, log_level)
 
 
+def apply_settings(config: dict | None = None) -> None:
+    """Apply settings to all live loggers at once.
+
+    Levels, formats and sizes of memory logs are changed in place. If log path
+    settings are changed, log groups continue in new files under the new path.
+    """
+    config = config or get_settings()
+    with _LOGGER_LOCK:
+        for logger in set(_LOGGER_CONTAINER.values()):
+            _apply_settings(logger, config)
+            _APPLIED_SETTINGS[logger.name] = config
+
+
+def _apply_settings(logger: logging.Logger, config: dict) -> None:
+    log_paths = _get_log_paths(config)
+    if _LOG_PATHS.get(logger.name, log_paths) != log_paths:
+        _move_log_groups(logger, config)
+    _LOG_PATHS[logger.name] = log_paths
+
+    formatter = _get_formatter(config)
+    for hdlr in _iter_handlers(logger):
+        hdlr.setFormatter(formatter)
+        if isinstance(hdlr, LimitedMemoryHandler):
+            hdlr.change_max_len(config["MEMORY_LOG_SIZE"])
+            if hdlr.target is not None:
+                hdlr.target.setFormatter(formatter)
+    set_log_level_from_config(logger, config)
+
+
+def _move_log_groups(logger: logging.Logger, config: dict) -> None:
+    """Open files of the log groups under the new log path.
+
+    Active routes are switched to the new handlers at once, retired ones
+    are reopened under the new path when they are used again.
+    """
+    dispatcher = _find_dispatch_handler(logger)
+    if dispatcher is not None:
+        for folder_name, file_prefix in dispatcher.get_route_keys():
+            if dispatcher.is_retired(folder_name, file_prefix):
+                log_path = _get_group_log_path(folder_name, file_prefix, config)
+                factory = None
+                if log_path:
+                    factory = partial(
+                        _reopen_file_handlers, log_path, folder_name, file_prefix
+                    )
+                dispatcher.set_factory(folder_name, file_prefix, factory)
+                continue
+            old_hdlrs = dispatcher.get_handlers(folder_name, file_prefix)
+            hdlrs, factory = _open_log_group(folder_name, file_prefix, config)
+            if factory is None:
+                dispatcher.set_factory(folder_name, file_prefix, None)
+            dispatcher.add_route(folder_name, file_prefix, hdlrs, factory)
+            dispatcher.close_handlers(old_hdlrs, partial(_close_handler, flush=False))
+
+    missing_context_hdlr = _find_missing_context_handler(logger)
+    if missing_context_hdlr is not None:
+        logger.removeHandler(missing_context_hdlr)
+        missing_context_hdlr.close()
+        _add_missing_context_handler(logger, config)
+        _add_rate_limit_filter(logger, config)
+
+
+def _get_log_paths(config: dict) -> tuple[str | None, str | None]:
+    return _get_log_path_config(config), config.get("DEFAULT_LOG_PATH")
+
+
 def _get_log_path_config(config):
     """Get log path based on the environment variable or Windows/Unix config setting.
 
@@ -111,8 +313,29 @@ def _get_log_path_config(config):
         return config.get("UNIX_LOG_PATH")
 
 
+def _can_create_dir(path: str) -> bool:
+    """Check that the nearest existing parent of the directory is writable."""
+    path = os.path.abspath(path)
+    while True:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+            continue
+        except OSError:
+            return False
+        return stat.S_ISDIR(st.st_mode) and os.access(path, os.W_OK | os.X_OK)
+
+
 def _prepare_log_path(log_path, log_file_name):
-    """Create logs directory if needed and return full path to the log file.
+    """Verify logs directory and return full path to the log file.
+
+    A missing directory isn't created here, file handlers create it with
+    the first written record. Writable directories are remembered for
+    WRITABLE_DIR_TTL seconds.
 
     :param str log_path:
     :param str log_file_name:
@@ -123,28 +346,37 @@ def _prepare_log_path(log_path, log_file_name):
 
     log_file = os.path.join(log_path, log_file_name)
 
+    verified_at = _WRITABLE_DIRS.get(log_path)
+    now = time.monotonic()
+    if verified_at is not None and now - verified_at < WRITABLE_DIR_TTL:
+        return log_file
+
     if os.path.isdir(log_path):
         if os.access(log_path, os.W_OK):
+            _WRITABLE_DIRS[log_path] = now
             return log_file
-    else:
-        try:
-            os.makedirs(log_path)
-            return log_file
-        except Exception:
-            pass
+    elif _can_create_dir(log_path):
+        _WRITABLE_DIRS[log_path] = now
+        return log_file
+
+
+def clear_log_path_cache():
+    """Forget verified log directories, they are checked again on next use."""
+    _WRITABLE_DIRS.clear()
 
 
 # return accessable log path or None
-def get_accessible_log_path(reservation_id="Autoload", handler="default"):
+def get_accessible_log_path(reservation_id="Autoload", handler="default", config=None):
     """Generate log path for the logger and verify that it's accessible.
 
      Using LOG_PATH/reservation_id/handler-%timestamp%.log
 
     :param reservation_id: part of log path
     :param handler: handler name for logger
+    :param config: settings, they are read if not passed
     :return: generated log path
     """
-    config = get_settings()
+    config = config or get_settings()
     time_format = config["TIME_FORMAT"] or DEFAULT_TIME_FORMAT
     log_file_name = f"{handler}--{datetime.now().strftime(time_format)}.log"
 
@@ -196,13 +428,26 @@ def get_qs_logger(
     if use_context:
         set_logger_context(folder_name=log_group, file_prefix=log_file_prefix)
     config = get_settings()
+
+    # fast path without locking, settings are already applied to the logger
+    logger = _LOGGER_CONTAINER.get(log_group)
+    if logger is not None and _APPLIED_SETTINGS.get(logger.name) == config:
+        _touch_log_group(logger, log_group, log_file_prefix)
+        return logger
+
     _LOGGER_LOCK.acquire()
     try:
         if log_group in _LOGGER_CONTAINER:
             logger = _LOGGER_CONTAINER[log_group]
+            _touch_log_group(logger, log_group, log_file_prefix)
             # log level may change between executions
             set_log_level_from_config(logger, config)
+            _APPLIED_SETTINGS[logger.name] = config
         else:
+            # exec info is logged once, not when the evicted group is reopened
+            reopened = use_context and _is_log_group_open(
+                log_category, log_group, log_file_prefix
+            )
             logger = _create_logger(
                 log_group,
                 log_category,
@@ -211,9 +456,15 @@ def get_qs_logger(
                 use_context=use_context,
             )
             _LOGGER_CONTAINER[log_group] = logger
+            _LOG_PATHS.setdefault(logger.name, _get_log_paths(config))
+            _evict_log_groups(config)
+            _start_janitor(config)
+            _start_config_watcher(config)
+            _start_log_forwarding(config)
             # we have to set log level before logging exec info
             set_log_level_from_config(logger, config)
-            if exec_info:
+            _APPLIED_SETTINGS[logger.name] = config
+            if exec_info and not reopened:
                 log_execution_info(logger, exec_info)
     finally:
         _LOGGER_LOCK.release()
@@ -221,6 +472,20 @@ def get_qs_logger(
     return logger
 
 
+def _is_log_group_open(log_category: str, log_group: str, file_prefix: str) -> bool:
+    """Check if the log group has active or evicted handlers."""
+    dispatcher = _find_dispatch_handler(logging.getLogger(log_category))
+    if dispatcher is None:
+        return False
+    return (log_group, file_prefix) in dispatcher.get_route_keys(log_group)
+
+
+def _touch_log_group(logger: logging.Logger, log_group: str, file_prefix: str):
+    dispatcher = _find_dispatch_handler(logger)
+    if dispatcher is not None:
+        dispatcher.touch(log_group, file_prefix)
+
+
 def _create_logger(
     log_group: str,
     log_category: str,
@@ -249,14 +514,113 @@ def _create_logger(
     """
     config = config or get_settings()
     logger = logging.getLogger(log_category)
+    if is_forwarded_logger(log_category):
+        # a worker of the process pool, the parent writes the files
+        return logger
     logger.setLevel(logging.DEBUG)
+    parent_address = get_parent_address()
+    if parent_address is not None:
+        _add_forwarding_handler(logger, config, *parent_address)
+        return logger
     _add_main_handlers(logger, config, log_file_prefix, log_group, use_context)
     if use_context:
+        _add_context_resolver(logger)
         _add_missing_context_handler(logger, config)
+    _add_rate_limit_filter(logger, config)
 
     return logger
 
 
+def _add_context_resolver(logger: logging.Logger) -> None:
+    """Resolve the log context once per record for all filters and handlers."""
+    if not any(isinstance(f, ResolveContextFilter) for f in logger.filters):
+        logger.addFilter(ResolveContextFilter())
+
+
+def _add_forwarding_handler(
+    logger: logging.Logger, config: dict, address: str, authkey: bytes
+) -> None:
+    """Send records of the child process to the handlers of the parent."""
+    for hdlr in list(logger.handlers):
+        if isinstance(hdlr, BatchForwardingHandler):
+            return
+        # handlers inherited from the parent process write to its files
+        logger.removeHandler(hdlr)
+    hdlr = BatchForwardingHandler(
+        address,
+        authkey,
+        batch_size=int(_get_config_value(config, "FORWARD_BATCH_SIZE", 100)),
+        flush_interval=int(_get_config_value(config, "FORWARD_FLUSH_INTERVAL", 200)),
+    )
+    hdlr.forward_all_levels = config["MEMORY_LOG_SIZE"] > 0
+    logger.addHandler(hdlr)
+
+
+def _start_log_forwarding(config: dict) -> None:
+    """Receive records of child processes if FORWARD_CHILD_LOGS is set."""
+    if _get_bool_config_value(config, "FORWARD_CHILD_LOGS"):
+        if not is_forwarding_child():
+            start_forwarding_server(_handle_forwarded_record)
+
+
+def _handle_forwarded_record(record: logging.LogRecord) -> None:
+    """Open files of the child's log group if the parent doesn't log to it."""
+    log_context = record.__dict__.get("log_context")
+    logger = logging.getLogger(record.name)
+    dispatcher = None
+    while logger is not None and log_context is not None:
+        dispatcher = _find_dispatch_handler(logger)
+        if dispatcher is not None:
+            break
+        logger = logger.parent
+    if dispatcher is not None and not dispatcher.restore_route(*log_context):
+        folder_name, file_prefix = log_context
+        with _LOGGER_LOCK:
+            if not dispatcher.get_handlers(folder_name, file_prefix):
+                config = get_settings()
+                _add_main_handlers(logger, config, file_prefix, folder_name, True)
+                _set_handlers_level(
+                    dispatcher.get_handlers(folder_name, file_prefix),
+                    config.get("LOG_LEVEL", DEFAULT_LEVEL),
+                )
+                _update_logger_level(logger)
+    handle_forwarded_record(record)
+
+
+def _clear_loggers_after_fork() -> None:
+    # loggers of the parent write to its files, the child forwards records
+    if is_forwarding_child():
+        _LOGGER_CONTAINER.clear()
+        _APPLIED_SETTINGS.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_clear_loggers_after_fork)
+
+
+def _add_rate_limit_filter(logger: logging.Logger, config: dict) -> None:
+    """Limit records of noisy log sites if RATE_LIMIT is configured.
+
+    One filter is shared by the handlers of the logger, it counts a record
+    once for all of them. The filter isn't added to the logger, records of
+    child loggers don't pass filters of the logger.
+    """
+    limits = _get_config_value(config, "RATE_LIMIT")
+    if not limits:
+        return
+    filter_ = None
+    for hdlr in logger.handlers:
+        for f in hdlr.filters:
+            if isinstance(f, RateLimitFilter):
+                filter_ = f
+    if filter_ is None:
+        interval = float(_get_config_value(config, "RATE_LIMIT_SUMMARY_INTERVAL", 60))
+        filter_ = RateLimitFilter(parse_limits(limits), summary_interval=interval)
+    for hdlr in logger.handlers:
+        # the filter is added after the context filter of the missed logs
+        hdlr.addFilter(filter_)
+
+
 def _add_main_handlers(
     logger: logging.Logger,
     config: dict,
@@ -264,60 +628,300 @@ def _add_main_handlers(
     folder_name: str,
     use_context: bool,
 ) -> None:
-    filter_by_context = FilterByContext(
-        logger.name,
-        folder_name=folder_name,
-        file_prefix=file_prefix,  # use original file prefix
-    )
+    if use_context:
+        dispatcher = _get_dispatch_handler(logger)
+        # reopen files of the evicted log group
+        if dispatcher.restore_route(folder_name, file_prefix):
+            return
+
+    hdlrs, factory = _open_log_group(folder_name, file_prefix, config)
+    if use_context:
+        # use original file prefix
+        dispatcher.add_route(folder_name, file_prefix, hdlrs, factory)
+    else:
+        for hdlr in hdlrs:
+            logger.addHandler(hdlr)
+
+
+def _get_group_log_path(folder_name: str, file_prefix: str, config: dict):
     log_file_prefix = re.sub(" ", "_", file_prefix)
+    return get_accessible_log_path(folder_name, log_file_prefix, config)
 
-    log_path = get_accessible_log_path(folder_name, log_file_prefix)
+
+def _open_log_group(
+    folder_name: str, file_prefix: str, config: dict
+) -> tuple[tuple[logging.Handler, ...], HandlersFactory | None]:
+    """Create handlers of the log group and the factory that reopens them."""
+    log_path = _get_group_log_path(folder_name, file_prefix, config)
     if log_path:
-        hdlr1 = logging.FileHandler(log_path, mode="a")
-        hdlr2 = _add_memory_handler(log_path, config)
-        hdlrs = (hdlr1, hdlr2)
+        hdlrs = _create_file_handlers(log_path, config, folder_name, file_prefix)
+        factory = partial(_reopen_file_handlers, log_path, folder_name, file_prefix)
     else:
         hdlrs = (logging.StreamHandler(sys.stdout),)
+        hdlrs[0].setFormatter(_get_formatter(config))
+        factory = None
+    return hdlrs, factory
 
-    for hdlr in hdlrs:
-        if use_context:
-            hdlr.addFilter(filter_by_context)
 
-        formatter = MultiLineFormatter(config["LOG_FORMAT"])
+def _create_file_handlers(
+    log_path: str, config: dict, folder_name: str, file_prefix: str
+) -> tuple[logging.Handler, ...]:
+    # files and directories are created on the first written record
+    hdlr1 = _wrap_async_handler(
+        _create_file_handler(log_path, config, delay=True), config
+    )
+    hdlr2 = _add_memory_handler(log_path, config, name=f"{folder_name}/{file_prefix}")
+    hdlrs = (hdlr1, hdlr2)
+
+    for hdlr in hdlrs:
+        formatter = _get_formatter(config)
         hdlr.setFormatter(formatter)
+    return hdlrs
 
-        logger.addHandler(hdlr)
+
+def _reopen_file_handlers(
+    log_path: str, folder_name: str, file_prefix: str
+) -> tuple[logging.Handler, ...]:
+    """Create handlers of the evicted log group for the same file."""
+    config = get_settings()
+    hdlrs = _create_file_handlers(log_path, config, folder_name, file_prefix)
+    _set_handlers_level(hdlrs, config.get("LOG_LEVEL", DEFAULT_LEVEL))
+    return hdlrs
+
+
+def _get_formatter(config: dict) -> logging.Formatter:
+    """Get formatter shared by handlers with the same format.
+
+    LOG_OUTPUT selects text records formatted by LOG_FORMAT or JSON lines.
+    """
+    output = str(_get_config_value(config, "LOG_OUTPUT", "text")).strip().lower()
+    key = (output, None) if output == "json" else (output, config["LOG_FORMAT"])
+    formatter = _FORMATTERS.get(key)
+    if formatter is None:
+        if output == "json":
+            formatter = JSONFormatter()
+        else:
+            formatter = MultiLineFormatter(config["LOG_FORMAT"])
+        formatter = _FORMATTERS.setdefault(key, formatter)
+    return formatter
+
+
+def _create_file_handler(
+    log_path: str | Path, config: dict, delay: bool = False
+) -> logging.FileHandler:
+    """Create file handler, shared, rolling or buffered one according to the config."""
+    flush_bytes = int(_get_config_value(config, "BUFFER_SIZE", 64 * 1024))
+    flush_interval = int(_get_config_value(config, "BUFFER_FLUSH_INTERVAL", 1000))
+    if _get_bool_config_value(config, "SHARED_WRITER"):
+        idle_timeout = _get_config_value(
+            config, "SHARED_WRITER_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT
+        )
+        return SharedFileHandler(
+            log_path,
+            mode="a",
+            delay=delay,
+            flush_bytes=flush_bytes,
+            flush_interval=flush_interval,
+            idle_timeout=float(idle_timeout),
+        )
+    max_bytes = int(_get_config_value(config, "ROTATE_MAX_BYTES", 0))
+    interval = float(_get_config_value(config, "ROTATE_INTERVAL", 0))
+    if max_bytes > 0 or interval > 0:
+        if not _get_bool_config_value(config, "BUFFERED_WRITE"):
+            flush_bytes = 0
+        compression = _get_config_value(config, "ROTATE_COMPRESSION", "none")
+        return RollingFileHandler(
+            log_path,
+            mode="a",
+            delay=delay,
+            flush_bytes=flush_bytes,
+            flush_interval=flush_interval,
+            max_bytes=max_bytes,
+            interval=interval,
+            backup_count=int(_get_config_value(config, "ROTATE_BACKUP_COUNT", 0)),
+            compression=compression.lower(),
+        )
+    if _get_bool_config_value(config, "BUFFERED_WRITE"):
+        return BufferedFileHandler(
+            log_path,
+            mode="a",
+            delay=delay,
+            flush_bytes=flush_bytes,
+            flush_interval=flush_interval,
+        )
+    return FileHandler(log_path, mode="a", delay=delay)
+
+
+def _wrap_async_handler(hdlr: logging.Handler, config: dict) -> logging.Handler:
+    """Write records in the background thread if it's enabled in the config."""
+    if not _get_bool_config_value(config, "ASYNC_WRITE"):
+        return hdlr
+    writer = get_async_writer(
+        max_size=int(_get_config_value(config, "ASYNC_QUEUE_SIZE", 10000)),
+        policy=_get_config_value(config, "ASYNC_OVERFLOW_POLICY", "block").lower(),
+        sample_rate=int(_get_config_value(config, "ASYNC_SAMPLE_RATE", 10)),
+    )
+    return AsyncHandler(hdlr, writer)
+
+
+def _find_dispatch_handler(logger: logging.Logger) -> ContextDispatchHandler | None:
+    for h in logger.handlers:
+        if isinstance(h, ContextDispatchHandler):
+            return h
+    return None
+
+
+def _get_dispatch_handler(logger: logging.Logger) -> ContextDispatchHandler:
+    dispatcher = _find_dispatch_handler(logger)
+    if dispatcher is None:
+        dispatcher = ContextDispatchHandler()
+        logger.addHandler(dispatcher)
+    return dispatcher
+
+
+def evict_log_groups(config: dict | None = None) -> list[tuple[str, str]]:
+    """Close handlers of idle log groups according to the config.
+
+    Log groups not used for LOG_GROUP_IDLE_TIMEOUT seconds and least recently
+    used groups above LOG_GROUP_MAX per category are evicted. Their files are
+    reopened when they are used again.
+
+    :return: (log group, file prefix) of evicted groups
+    """
+    config = config or get_settings()
+    with _LOGGER_LOCK:
+        return _evict_log_groups(config)
+
+
+def _evict_log_groups(config: dict) -> list[tuple[str, str]]:
+    idle_timeout = float(_get_config_value(config, "LOG_GROUP_IDLE_TIMEOUT", 0))
+    max_groups = int(_get_config_value(config, "LOG_GROUP_MAX", 0))
+    if not idle_timeout and not max_groups:
+        return []
+    flush = _get_bool_config_value(config, "LOG_GROUP_FLUSH_ON_EVICT")
+
+    evicted = []
+    for logger in set(_LOGGER_CONTAINER.values()):
+        dispatcher = _find_dispatch_handler(logger)
+        if dispatcher is None:
+            continue
+        for folder_name, file_prefix in dispatcher.get_idle_routes(
+            idle_timeout, max_groups
+        ):
+            dispatcher.close_handlers(
+                dispatcher.retire_route(folder_name, file_prefix),
+                partial(_close_handler, flush=flush),
+            )
+            if _LOGGER_CONTAINER.get(folder_name) is logger:
+                del _LOGGER_CONTAINER[folder_name]
+            evicted.append((folder_name, file_prefix))
+    return evicted
+
+
+def _close_handler(hdlr: logging.Handler, flush: bool = True) -> None:
+    if isinstance(hdlr, LimitedMemoryHandler):
+        target = hdlr.target
+        if flush:
+            hdlr.flush()
+        hdlr.close()
+        if target is not None:
+            target.close()
+    else:
+        hdlr.close()
+
+
+def get_janitor(config: dict | None = None, root: str | None = None) -> Janitor | None:
+    """Create janitor of the log directory with quotas from the config.
+
+    :param root: log directory, the configured one by default
+    """
+    config = config or get_settings()
+    root = root or _get_log_path_config(config)
+    if not root:
+        return None
+    if root.startswith(".."):
+        root = os.path.join(os.path.dirname(__file__), root)
+    return Janitor(
+        root,
+        max_age=float(_get_config_value(config, "RETENTION_MAX_AGE", 0)) * DAY,
+        max_bytes=int(_get_config_value(config, "RETENTION_MAX_BYTES", 0)),
+        reservation_max_bytes=int(
+            _get_config_value(config, "RETENTION_RESERVATION_MAX_BYTES", 0)
+        ),
+        compress_after=float(_get_config_value(config, "RETENTION_COMPRESS_AFTER", 0))
+        * DAY,
+        compression=_get_config_value(config, "RETENTION_COMPRESSION", "gzip").lower(),
+        active_time=float(
+            _get_config_value(config, "RETENTION_ACTIVE_TIME", DEFAULT_ACTIVE_TIME)
+        ),
+    )
+
+
+def _start_janitor(config: dict) -> None:
+    """Clean the log directory in the background if quotas are configured."""
+    interval = float(_get_config_value(config, "RETENTION_INTERVAL", 0))
+    if interval <= 0:
+        return
+    janitor = get_janitor(config)
+    if janitor is not None and janitor.enabled:
+        start_janitor(janitor, interval)
+
+
+def _start_config_watcher(config: dict) -> None:
+    """Apply changes of the config file to live loggers if WATCH_CONFIG is set."""
+    if _get_bool_config_value(config, "WATCH_CONFIG"):
+        interval = float(_get_config_value(config, "WATCH_CONFIG_INTERVAL", 1))
+        start_config_watcher(get_config_path, apply_settings, interval)
 
 
-def _add_memory_handler(log_path: str, config):
+def _add_memory_handler(log_path: str, config, name: str | None = None):
     log_path = Path(log_path)
     folder_path = log_path.parent
     file_name = log_path.name.rstrip(".log") + "-debug.log"
     debug_log_path = folder_path / file_name
 
-    target_hdlr = logging.FileHandler(debug_log_path, mode="a", delay=True)
-    memory_hdlr = LimitedMemoryHandler(config["MEMORY_LOG_SIZE"], target_hdlr)
+    target_hdlr = _wrap_async_handler(
+        _create_file_handler(debug_log_path, config, delay=True), config
+    )
+    total_bytes = int(_get_config_value(config, "MEMORY_LOG_TOTAL_BYTES", 0))
+    budget = get_memory_budget(total_bytes) if total_bytes > 0 else None
+    if _get_config_value(config, "MEMORY_LOG_MODE", "records").lower() == "compact":
+        memory_hdlr = CompactMemoryHandler(
+            config["MEMORY_LOG_SIZE"],
+            target_hdlr,
+            max_bytes=int(_get_config_value(config, "MEMORY_LOG_BYTES", 1024 * 1024)),
+            budget=budget,
+        )
+    else:
+        memory_hdlr = LimitedMemoryHandler(
+            config["MEMORY_LOG_SIZE"], target_hdlr, budget=budget
+        )
+    if name:
+        memory_hdlr.set_name(name)
     patch_logging_shutdown()
 
-    formatter = MultiLineFormatter(config["LOG_FORMAT"])
+    formatter = _get_formatter(config)
     target_hdlr.setFormatter(formatter)
 
     return memory_hdlr
 
 
+def _find_missing_context_handler(logger: logging.Logger) -> logging.Handler | None:
+    for hdlr in logger.handlers:
+        h = hdlr.target if isinstance(hdlr, AsyncHandler) else hdlr
+        if isinstance(h, RotatingFileHandler):
+            if h.baseFilename.endswith(MISSING_LOGS_NAME):
+                return hdlr
+    return None
+
+
 def _add_missing_context_handler(logger: logging.Logger, config: dict) -> None:
     log_path = _get_log_path_config(config)
     if not log_path:
         return  # we save missed logs only for file handlers
 
-    missing_logs_name = "missed_logs.log"
-    missing_logs_path = os.path.join(log_path, missing_logs_name)
-
-    for h in logger.handlers:
-        if isinstance(h, RotatingFileHandler):
-            if h.baseFilename.endswith(missing_logs_name):
-                break
-    else:
+    missing_logs_path = os.path.join(log_path, MISSING_LOGS_NAME)
+    if _find_missing_context_handler(logger) is None:
         hdlr = RotatingFileHandler(
             missing_logs_path,
             mode="a",
@@ -325,7 +929,8 @@ def _add_missing_context_handler(logger: logging.Logger, config: dict) -> None:
             maxBytes=10 * 1024 * 1024,
             backupCount=2,
         )
-        formatter = MultiLineFormatter(config["LOG_FORMAT"])
+        hdlr = _wrap_async_handler(hdlr, config)
+        formatter = _get_formatter(config)
         hdlr.setFormatter(formatter)
         filter_ = FilterOnlyWithoutContext(logger.name)
         hdlr.addFilter(filter_)
@@ -349,51 +954,65 @@ def qs_time_this(func):
 
 
 def get_log_path(logger=logging.getLogger()):
-    for hdlr in logger.handlers:
+    for hdlr in _iter_handlers(logger):
         if isinstance(hdlr, logging.FileHandler):
             return hdlr.baseFilename
     return None
 
 
+# \033[1;32;40m
+# \033[ - Escape code
+# 1     - style
+# 32    - text color
+# 40    - Background colour
+_COLOR_PATTERN = r"\[(?:\d+;){0,2}\d+m"
+# 27 - ESC character is one of them
+_CONTROL_CHARS = r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]"
+# \r of \r\n, even if they are separated by color codes
+_CRLF_CR = rf"\r(?=(?:{_COLOR_PATTERN}|\x1b)*\n)"
+# color codes, control chars and \r of \r\n are cleared in one pass
+_NORMALIZE_RE = re.compile(f"{_COLOR_PATTERN}|{_CRLF_CR}|{_CONTROL_CHARS}")
+
+
 def normalize_buffer(input_buffer):
     """Clear color from input_buffer and special characters.
 
     :param str input_buffer: input buffer string from device
     :return: str
     """
-    # \033[1;32;40m
-    # \033[ - Escape code
-    # 1     - style
-    # 32    - text color
-    # 40    - Background colour
-    color_pattern = re.compile(
-        r"\[(\d+;){0,2}?\d+m|\b|" + chr(27)
-    )  # 27 - ESC character
-
-    result_buffer = ""
-
     if not isinstance(input_buffer, str):
         input_buffer = str(input_buffer)
 
-    match_iter = color_pattern.finditer(input_buffer)
+    # nothing to clear in printable ASCII without color codes
+    if (
+        input_buffer.isascii()
+        and input_buffer.isprintable()
+        and "[" not in input_buffer
+    ):
+        return input_buffer
 
-    current_index = 0
-    for match_color in match_iter:
-        match_range = match_color.span()
-        result_buffer += input_buffer[current_index : match_range[0]]
-        current_index = match_range[1]
-
-    result_buffer += input_buffer[current_index:]
-
-    result_buffer = result_buffer.replace("\r\n", "\n")
-
-    return re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]", "", result_buffer)
+    return _NORMALIZE_RE.sub("", input_buffer)
 
 
 class MultiLineFormatter(logging.Formatter):
-    """Log Formatter, Append log header to each line."""
+    """Log Formatter, Append log header to each line.
+
+    Formatted records are cached in the record by the format, so handlers with
+    the same format don't format the record again.
+    """
 
     MAX_SPLIT = 1
+    CACHE_ATTR = "_qs_format_cache"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_key = (type(self), self._style._fmt, self.datefmt)
+        # the part of the format before the message is the header of each line
+        self._header_fmt = None
+        fmt = self._style._fmt
+        if type(self._style) is logging.PercentStyle:
+            if fmt.count("%(message)s") == 1:
+                self._header_fmt = fmt.split("%(message)s", 1)[0]
 
     def format(self, record):  # noqa: A003
         """Formatting for one or multi-line message.
@@ -401,22 +1020,103 @@ class MultiLineFormatter(logging.Formatter):
         :param record:
         :return:
         """
-        s = ""
-
         if record.msg == "":
-            return s
+            return ""
+        return self._format_cached(record)
+
+    def _format_cached(self, record):
+        cache = record.__dict__.get(self.CACHE_ATTR)
+        if cache is None:
+            cache = {}
+            setattr(record, self.CACHE_ATTR, cache)
+        else:
+            s = cache.get(self._cache_key)
+            if s is not None:
+                FORMAT_STATS["reused"] += 1
+                return s
 
+        s = ""
         try:
-            record.msg = normalize_buffer(record.msg)
-            s = logging.Formatter.format(self, record)
-            header, footer = s.rsplit(record.message, self.MAX_SPLIT)
-            s = s.replace("\n", "\n" + header)
+            s = self._format(record)
         except Exception as e:
             print(traceback.format_exc())  # noqa: T201
             print("logger.format: Unexpected error: " + str(e))  # noqa: T201
             print(f"record = {traceback.format_exc()}<<<")  # noqa: T201
+        else:
+            cache[self._cache_key] = s
         return s
 
+    def _format(self, record):
+        FORMAT_STATS["formatted"] += 1
+        record.message = normalize_buffer(record.getMessage())
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        s = self.formatMessage(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            if s[-1:] != "\n":
+                s += "\n"
+            s += record.exc_text
+        if record.stack_info:
+            if s[-1:] != "\n":
+                s += "\n"
+            s += self.formatStack(record.stack_info)
+
+        if "\n" not in s:
+            return s
+        if self._header_fmt is not None:
+            header = self._header_fmt % record.__dict__
+        else:
+            header, _ = s.rsplit(record.message, self.MAX_SPLIT)
+        return s.replace("\n", "\n" + header)
+
+
+class JSONFormatter(MultiLineFormatter):
+    """Log Formatter, one JSON object per line.
+
+    Multi-line messages and tracebacks are escaped instead of repeating the
+    header. The log group and the file prefix are taken from the log context
+    of the record.
+    """
+
+    default_time_format = "%Y-%m-%dT%H:%M:%S"
+    default_msec_format = "%s.%03d"
+    _encoder = json.JSONEncoder(
+        ensure_ascii=False, check_circular=False, separators=(",", ":")
+    )
+
+    def __init__(self, datefmt=None):
+        super().__init__("%(message)s", datefmt)
+
+    def format(self, record):  # noqa: A003
+        # records with empty messages are objects too, not blank lines
+        return self._format_cached(record)
+
+    def _format(self, record):
+        FORMAT_STATS["formatted"] += 1
+        record.message = normalize_buffer(record.getMessage())
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "module": record.module,
+            "func": record.funcName,
+            "line": record.lineno,
+            "message": record.message,
+        }
+        context = resolve_record_context(record)
+        if context is not None:
+            data["log_group"], data["prefix"] = context
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return self._encoder.encode(data)
+
 
 class Loggable:
     """Interface for Instances which uses Logging."""
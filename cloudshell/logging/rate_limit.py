@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Mapping, NamedTuple
+
+SUMMARY_ATTR = "rate_limit_summary"
+# (id of the filter, the record passed), handlers sharing the filter reuse it
+DECISION_ATTR = "_rate_limit_decision"
+
+
+class Limit(NamedTuple):
+    rate: float  # records per second
+    burst: float  # records allowed at once
+
+
+def parse_limits(value: str) -> dict[int, Limit]:
+    """Parse limits per level, "DEBUG:10/100,INFO:20/200" - level:rate/burst."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        level_name, _, limit = item.partition(":")
+        rate, _, burst = limit.partition("/")
+        level = logging.getLevelName(level_name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level {level_name}")
+        rate = float(rate)
+        limits[level] = Limit(rate, float(burst) if burst else max(rate, 1))
+    return limits
+
+
+class _Site:
+    __slots__ = ("tokens", "updated_at", "suppressed", "summary_at")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+        self.suppressed = 0
+        self.summary_at = now
+
+
+class RateLimitFilter(logging.Filter):
+    """Limit records of every log site with a token bucket per level.
+
+    A site is (logger name, path, line number). Records of levels without
+    a limit always pass. When records of a site were suppressed, a summary
+    record "Suppressed N similar messages" is logged before the next record
+    that passes, not more often than every summary_interval seconds.
+    The least recently added sites are forgotten above max_sites.
+
+    The filter can be shared by handlers, a record is counted once and the
+    other handlers get the same decision.
+    """
+
+    def __init__(
+        self,
+        limits: Mapping[int, Limit],
+        summary_interval: float = 60,
+        max_sites: int = 10000,
+    ):
+        super().__init__()
+        self.limits = dict(limits)
+        self.summary_interval = summary_interval
+        self.max_sites = max_sites
+        self.suppressed = 0
+        self._sites: dict[tuple, _Site] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:  # noqa: A003
+        limit = self.limits.get(record.levelno)
+        if limit is None or record.__dict__.get(SUMMARY_ATTR):
+            return True
+        decision = record.__dict__.get(DECISION_ATTR)
+        if decision is not None and decision[0] == id(self):
+            return decision[1]
+        passed = self._take_token(record, limit)
+        setattr(record, DECISION_ATTR, (id(self), passed))
+        return passed
+
+    def _take_token(self, record: logging.LogRecord, limit: Limit) -> bool:
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        suppressed = 0
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) >= self.max_sites:
+                    del self._sites[next(iter(self._sites))]
+                site = self._sites[key] = _Site(limit.burst, now)
+            else:
+                site.tokens = min(
+                    limit.burst, site.tokens + (now - site.updated_at) * limit.rate
+                )
+                site.updated_at = now
+            if site.tokens < 1:
+                site.suppressed += 1
+                self.suppressed += 1
+                return False
+            site.tokens -= 1
+            if site.suppressed and now - site.summary_at >= self.summary_interval:
+                suppressed = site.suppressed
+                site.suppressed = 0
+                site.summary_at = now
+
+        if suppressed:
+            self._log_summary(record, suppressed)
+        return True
+
+    @staticmethod
+    def _log_summary(record: logging.LogRecord, suppressed: int) -> None:
+        summary = logging.makeLogRecord(record.__dict__)
+        summary.msg = "Suppressed %d similar messages"
+        summary.args = (suppressed,)
+        summary.exc_info = summary.exc_text = summary.stack_info = None
+        summary.__dict__.pop("_qs_format_cache", None)
+        summary.__dict__.pop(DECISION_ATTR, None)
+        setattr(summary, SUMMARY_ATTR, True)
+        logging.getLogger(record.name).handle(summary)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import glob
+import gzip
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+from cloudshell.logging.file_handlers import BufferedFileHandler
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class Compression:
+    """Compression of rotated segments.
+
+    ZSTD is used if zstandard package is installed, otherwise GZIP is used.
+    """
+
+    NONE = "none"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+    ALL = (NONE, GZIP, ZSTD)
+
+
+SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+logger = logging.getLogger(__name__)
+
+
+class RollingFileHandler(BufferedFileHandler):
+    """Buffered file handler that rotates the file by size and time.
+
+    The file is renamed to <name>.<time><suffix> when it exceeds max_bytes or
+    every interval seconds, 0 disables the limit. Rotated segments are
+    compressed and segments above backup_count are removed in the background
+    thread, so the logging thread only renames the file.
+    """
+
+    def __init__(
+        self,
+        filename: str | os.PathLike,
+        mode: str = "a",
+        encoding: str | None = None,
+        delay: bool = False,
+        flush_bytes: int = 0,
+        flush_interval: int = 1000,
+        flushLevel: int = logging.ERROR,
+        max_bytes: int = 0,
+        interval: float = 0,
+        backup_count: int = 0,
+        compression: str = Compression.NONE,
+    ):
+        if compression not in Compression.ALL:
+            raise ValueError(f"Unknown compression {compression}")
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backup_count = backup_count
+        self.compression = compression
+        self._size = 0
+        self._rollover_at = self._get_rollover_at(time.time())
+        super().__init__(
+            filename,
+            mode=mode,
+            encoding=encoding,
+            delay=delay,
+            flush_bytes=flush_bytes,
+            flush_interval=flush_interval,
+            flushLevel=flushLevel,
+        )
+
+    def _get_rollover_at(self, now: float) -> float | None:
+        return now + self.interval if self.interval > 0 else None
+
+    def _open(self):
+        stream = super()._open()
+        self._size = stream.tell()
+        return stream
+
+    def should_rollover(self) -> bool:
+        if self._rollover_at is not None and time.time() >= self._rollover_at:
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None and os.path.exists(self.baseFilename):
+                self._size = os.path.getsize(self.baseFilename)
+            return self._size > 0 and self._size + self._buffered_size > self.max_bytes
+        return False
+
+    def do_rollover(self) -> None:
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        self._rollover_at = self._get_rollover_at(time.time())
+        if not os.path.exists(self.baseFilename):
+            return
+        if os.path.getsize(self.baseFilename):
+            segment = self.get_segment_name()
+            os.rename(self.baseFilename, segment)
+            get_compressor().submit(self, segment)
+        self._size = 0
+
+    def get_segment_name(self) -> str:
+        root, ext = os.path.splitext(self.baseFilename)
+        name = f"{root}.{time.strftime(SEGMENT_TIME_FORMAT)}"
+        # segments are sorted by the name, numbers of pruned segments aren't reused
+        existing = glob.glob(glob.escape(name) + "*")
+        if not existing:
+            return name + ext
+        num = max(_get_segment_key(path, root)[1] for path in existing) + 1
+        return f"{name}.{num}{ext}"
+
+    def get_segments(self) -> list[str]:
+        """Get rotated segments of the file, the oldest first."""
+        root, ext = os.path.splitext(self.baseFilename)
+        pattern = f"{glob.escape(root)}.[0-9]*{glob.escape(ext)}*"
+        segments = [path for path in glob.glob(pattern) if not path.endswith(".tmp")]
+        # mtime is changed by the compression, segments are sorted by the name
+        return sorted(segments, key=lambda path: _get_segment_key(path, root))
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._buffer and self.should_rollover():
+                self.do_rollover()
+            buffered_size = self._buffered_size
+            super().flush()
+            self._size += buffered_size
+        finally:
+            self.release()
+
+
+def _get_segment_key(path: str, root: str) -> tuple[str, int]:
+    # root.<SEGMENT_TIME_FORMAT>[.num]ext[.gz|.zst]
+    stamp, _, rest = path[len(root) + 1 :].partition(".")
+    num = rest.split(".", 1)[0]
+    return stamp, int(num) if num.isdigit() else 0
+
+
+def compress_file(path: str, compression: str) -> str:
+    """Compress the file and remove it, return the path of compressed file.
+
+    The file is compressed to a unique temporary file, so processes that
+    compress the same file don't write to one file.
+    """
+    if compression == Compression.ZSTD and zstandard is None:
+        compression = Compression.GZIP
+    dst = path + (".zst" if compression == Compression.ZSTD else ".gz")
+    fd, tmp = tempfile.mkstemp(
+        suffix=".tmp", prefix=os.path.basename(dst) + ".", dir=os.path.dirname(dst)
+    )
+    try:
+        with open(fd, "wb") as f, open(path, "rb") as src:
+            if compression == Compression.ZSTD:
+                zstandard.ZstdCompressor().copy_stream(src, f)
+            else:
+                with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                    shutil.copyfileobj(src, gz)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # removed by another process that compressed it
+    return dst
+
+
+class Compressor:
+    """Background thread that compresses and prunes rotated segments."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start()
+
+    def _start(self) -> None:
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+
+    def submit(self, handler: RollingFileHandler, segment: str) -> None:
+        self._queue.put((segment, handler.compression, handler))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="cloudshell-logging-compressor", daemon=True
+                )
+                self._thread.start()
+
+    def join(self) -> None:
+        """Wait until all submitted segments are processed."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            segment, compression, handler = self._queue.get()
+            try:
+                if compression != Compression.NONE:
+                    compress_file(segment, compression)
+                if handler.backup_count > 0:
+                    for path in handler.get_segments()[: -handler.backup_count]:
+                        os.remove(path)
+            except Exception:
+                logger.exception("Failed to process rotated segment %s", segment)
+            finally:
+                self._queue.task_done()
+
+    def _restart_after_fork(self) -> None:
+        # segments submitted by the parent are processed by the parent
+        self._lock = threading.Lock()
+        self._start()
+
+
+_COMPRESSOR = Compressor()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_COMPRESSOR._restart_after_fork)
+
+
+def get_compressor() -> Compressor:
+    return _COMPRESSOR
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Callable, Iterable
+
+
+class SettingsCache:
+    """Keep loaded settings until the config file or env variables change.
+
+    The cache key consists of the config path, the config file's mtime, inode
+    and size and values of the given environment variables. Settings are
+    reloaded only when the key differs from the one they were loaded with.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], dict],
+        get_config_path: Callable[[], str],
+        env_vars: Iterable[str],
+    ):
+        self._loader = loader
+        self._get_config_path = get_config_path
+        self._env_vars = tuple(env_vars)
+        self._lock = threading.Lock()
+        # (key, settings, generation) is replaced as a whole, so readers
+        # never see settings that don't match the key
+        self._state = (None, None, 0)
+
+    @property
+    def generation(self) -> int:
+        """Number of times settings were (re)loaded."""
+        return self._state[2]
+
+    def _get_key(self) -> tuple:
+        config_path = self._get_config_path()
+        try:
+            stat = os.stat(config_path)
+        except OSError:
+            file_key = None
+        else:
+            file_key = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        return config_path, file_key, self._get_env_key()
+
+    def _get_env_key(self) -> tuple:
+        return tuple(os.environ.get(name) for name in self._env_vars)
+
+    def get(self) -> dict:
+        """Return a copy of the actual settings, reload them if needed."""
+        key = self._get_key()
+        cached_key, settings, generation = self._state
+        if settings is None or key != cached_key:
+            with self._lock:
+                cached_key, settings, generation = self._state
+                if settings is None or key != cached_key:
+                    settings = self._loader()
+                    generation += 1
+                    self._state = (key, settings, generation)
+        return dict(settings)
+
+    def invalidate(self) -> None:
+        """Drop cached settings, next get() reloads them."""
+        with self._lock:
+            self._state = (None, None, self._state[2])
@@ -0,0 +1,344 @@
+r"""Single writer process for log files shared by the processes of a host.
+
+Processes send formatted records over a local socket (a named pipe on
+Windows) to the writer process of the log directory. The writer is started
+on demand, writes records of all processes to one file per log file name
+without a timestamp and exits when nobody uses it for idle_timeout seconds.
+
+The protocol doesn't use pickle. The first message of a connection is
+"<key>\0<file name>" encoded in UTF-8, where the key is the file name without
+the timestamp, the file name is used if the writer doesn't have an open file
+for the key yet. Other messages are formatted records encoded in UTF-8.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+
+from cloudshell.logging.file_handlers import BufferedFileHandler
+from cloudshell.logging.utils.file_lock import get_runtime_dir, try_lock_file
+
+IS_WINDOWS = sys.platform == "win32"
+DEFAULT_IDLE_TIMEOUT = 30
+# how long a client waits for the writer process to start
+CONNECT_TIMEOUT = 5
+# max number of messages written with one flush
+MAX_BATCH = 1000
+ENCODING = "utf-8"
+
+logger = logging.getLogger(__name__)
+
+
+def get_file_key(file_name: str) -> str:
+    """Get file name without the timestamp.
+
+    QS--<time>.log -> QS.log, QS--<time>-debug.log -> QS-debug.log
+    """
+    stem, sep, rest = file_name.partition("--")
+    if not sep:
+        return file_name
+    for suffix in ("-debug.log", ".log"):
+        if rest.endswith(suffix):
+            return stem + suffix
+    return stem + os.path.splitext(rest)[1]
+
+
+def get_writer_address(log_dir: str) -> tuple[str, str]:
+    """Get address and family of the writer's listener for the log directory."""
+    digest = hashlib.sha1(os.path.abspath(log_dir).encode(ENCODING)).hexdigest()[:16]
+    if IS_WINDOWS:
+        return rf"\\.\pipe\cloudshell-logging-{digest}", "AF_PIPE"
+    return os.path.join(get_runtime_dir(), f"{digest}.sock"), "AF_UNIX"
+
+
+def _get_lock_path(log_dir: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(log_dir).encode(ENCODING)).hexdigest()[:16]
+    return os.path.join(get_runtime_dir(), f"cloudshell-logging-{digest}.lock")
+
+
+class SharedWriter:
+    """Write records received from the processes to the files of the directory.
+
+    Every connection is read by its own thread, messages are written in the
+    order they are received, one flush per batch of messages.
+    """
+
+    def __init__(self, log_dir: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.log_dir = log_dir
+        self.idle_timeout = idle_timeout
+        self.address, self.family = get_writer_address(log_dir)
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._connections = 0
+        self._last_active = time.monotonic()
+        self._stopping = False
+        self._listener = None
+        # key -> [file, number of connections]
+        self._files: dict[str, list] = {}
+        # key -> path of the file
+        self._paths: dict[str, str] = {}
+
+    def serve(self) -> None:
+        lock = try_lock_file(_get_lock_path(self.log_dir))
+        if lock is None:
+            return  # another writer serves the directory
+        try:
+            if not IS_WINDOWS and os.path.exists(self.address):
+                os.unlink(self.address)  # left by the writer that died
+            self._listener = Listener(self.address, self.family)
+            threading.Thread(target=self._accept, daemon=True).start()
+            self._write()
+        finally:
+            lock.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                if self._stopping:
+                    conn.close()
+                    return
+                self._connections += 1
+            threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+
+    def _read(self, conn: Connection) -> None:
+        key = None
+        try:
+            key, file_name = conn.recv_bytes().decode(ENCODING).split("\0", 1)
+            self._queue.put((key, file_name))
+            while True:
+                self._queue.put((key, conn.recv_bytes()))
+        except (EOFError, OSError, ValueError):
+            pass
+        finally:
+            conn.close()
+            if key is not None:
+                self._queue.put((key, None))
+            with self._lock:
+                self._connections -= 1
+                self._last_active = time.monotonic()
+
+    def _open(self, key: str, file_name: str) -> None:
+        entry = self._files.get(key)
+        if entry is None:
+            # the key is written to the same file while the writer is running
+            path = self._paths.setdefault(
+                key, os.path.join(self.log_dir, os.path.basename(file_name))
+            )
+            os.makedirs(self.log_dir, exist_ok=True)
+            entry = self._files[key] = [open(path, "ab"), 0]
+        entry[1] += 1
+
+    def _release(self, key: str) -> None:
+        entry = self._files.get(key)
+        if entry is None:
+            return  # the file wasn't opened
+        entry[1] -= 1
+        if entry[1] == 0:
+            entry[0].close()
+            del self._files[key]
+
+    def _write(self) -> None:
+        poll_interval = min(self.idle_timeout, 1)
+        while True:
+            try:
+                batch = [self._queue.get(timeout=poll_interval)]
+            except queue.Empty:
+                if self._should_stop():
+                    return
+                continue
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list) -> None:
+        released = []
+        written = set()
+        for key, data in batch:
+            try:
+                if isinstance(data, str):
+                    self._open(key, data)
+                elif data is None:
+                    released.append(key)
+                else:
+                    self._files[key][0].write(data)
+                    written.add(key)
+            except (OSError, KeyError):
+                logger.exception("Failed to write records of %s", key)
+        for key in written:
+            try:
+                self._files[key][0].flush()
+            except OSError:
+                logger.exception("Failed to write records of %s", key)
+        for key in released:
+            self._release(key)
+
+    def _should_stop(self) -> bool:
+        with self._lock:
+            if self._connections or self._queue.qsize():
+                return False
+            if time.monotonic() - self._last_active < self.idle_timeout:
+                return False
+            self._stopping = True
+        try:
+            # wake up the accepting thread, it stops
+            Client(self.address, self.family).close()
+        except OSError:
+            pass
+        self._listener.close()
+        return True
+
+
+def start_writer_process(log_dir: str, idle_timeout: float) -> None:
+    """Start the writer process for the log directory in the background."""
+    # the writer runs the same package as the client
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    kwargs = {}
+    if IS_WINDOWS:
+        kwargs["creationflags"] = (
+            subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        )
+    else:
+        kwargs["start_new_session"] = True
+    proc = subprocess.Popen(
+        [sys.executable, "-m", __name__, log_dir, str(idle_timeout)],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        env=env,
+        **kwargs,
+    )
+    # reap the process when it exits
+    threading.Thread(target=proc.wait, daemon=True).start()
+
+
+def connect(log_dir: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> Connection:
+    """Connect to the writer of the log directory, start it if it's needed."""
+    address, family = get_writer_address(log_dir)
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    started_at = None
+    while True:
+        try:
+            return Client(address, family)
+        except OSError:
+            now = time.monotonic()
+            if now > deadline:
+                raise
+            # the writer can fail to start while the previous one is stopping
+            if started_at is None or now - started_at > 0.5:
+                start_writer_process(log_dir, idle_timeout)
+                started_at = now
+            time.sleep(0.02)
+
+
+class SharedWriterStream:
+    """Stream that sends written text to the writer process."""
+
+    def __init__(
+        self, log_dir: str, file_name: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT
+    ):
+        self.log_dir = log_dir
+        self.file_name = file_name
+        self.idle_timeout = idle_timeout
+        self._conn = None
+        self._pid = None
+        self._connect()
+
+    def _connect(self) -> None:
+        self._conn = connect(self.log_dir, self.idle_timeout)
+        self._pid = os.getpid()
+        hello = f"{get_file_key(self.file_name)}\0{self.file_name}"
+        self._conn.send_bytes(hello.encode(ENCODING))
+
+    def write(self, text: str) -> None:
+        data = text.encode(ENCODING, "backslashreplace")
+        if self._pid != os.getpid():
+            # the connection is shared with the parent process
+            self._connect()
+        try:
+            self._conn.send_bytes(data)
+        except OSError:
+            # the writer has stopped, send to the new one
+            self._conn.close()
+            self._connect()
+            self._conn.send_bytes(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self._conn is not None:
+            if self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class SharedFileHandler(BufferedFileHandler):
+    """Buffered file handler that writes records through the writer process.
+
+    Processes that use files with the same name in the directory, except the
+    timestamp, write to one file. It's the file of the process that connected
+    first to the writer, so baseFilename can differ from the written file.
+    If the writer isn't available records are written to baseFilename.
+    """
+
+    def __init__(
+        self,
+        filename: str | os.PathLike,
+        mode: str = "a",
+        encoding: str | None = None,
+        delay: bool = False,
+        flush_bytes: int = 64 * 1024,
+        flush_interval: int = 1000,
+        flushLevel: int = logging.ERROR,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ):
+        self.idle_timeout = idle_timeout
+        super().__init__(
+            filename,
+            mode=mode,
+            encoding=encoding,
+            delay=delay,
+            flush_bytes=flush_bytes,
+            flush_interval=flush_interval,
+            flushLevel=flushLevel,
+        )
+
+    def _open(self):
+        log_dir, file_name = os.path.split(self.baseFilename)
+        try:
+            return SharedWriterStream(log_dir, file_name, self.idle_timeout)
+        except OSError as e:
+            # the error isn't logged, the record could come back to the handler
+            print(  # noqa: T201
+                f"Failed to connect to the log writer of {log_dir}: {e}",
+                file=sys.stderr,
+            )
+            return super()._open()
+
+
+def main(argv: list[str] | None = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    log_dir = argv[0]
+    idle_timeout = float(argv[1]) if len(argv) > 1 else DEFAULT_IDLE_TIMEOUT
+    SharedWriter(log_dir, idle_timeout).serve()
+
+
+if __name__ == "__main__":
+    main()
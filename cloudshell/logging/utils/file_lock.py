@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+import stat
+import sys
+import tempfile
+
+IS_WINDOWS = sys.platform == "win32"
+
+
+def get_runtime_dir() -> str:
+    """Get the directory of sockets and lock files of the user."""
+    if IS_WINDOWS:
+        return tempfile.gettempdir()
+    uid = os.getuid()
+    path = os.path.join(tempfile.gettempdir(), f"cloudshell-logging-{uid}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # another user could create the directory to receive records of the user
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != uid:
+        raise PermissionError(f"{path} isn't a directory of the user")
+    if st.st_mode & 0o077:
+        raise PermissionError(f"{path} is accessible by other users")
+    return path
+
+
+def try_lock_file(path: str):
+    """Lock the file for the life of the process, return None if it's locked.
+
+    The lock is released when the returned file is closed.
+    """
+    f = open(path, "a+b")
+    try:
+        if IS_WINDOWS:
+            import msvcrt
+
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
@@ -2,9 +2,24 @@ from __future__ import annotations
 
 import atexit
 import logging
+from typing import Callable
+
+_SHUTDOWN_HOOKS: list[Callable[[], None]] = []
+
+
+def register_shutdown_hook(hook: Callable[[], None]) -> None:
+    """Register a function to call on shutdown before handlers are flushed."""
+    if hook not in _SHUTDOWN_HOOKS:
+        _SHUTDOWN_HOOKS.append(hook)
 
 
 def shutdown(handlerList=logging._handlerList):
+    for hook in _SHUTDOWN_HOOKS:
+        try:
+            hook()
+        except:  # noqa: E722
+            if logging.raiseExceptions:
+                raise
     for wr in reversed(handlerList[:]):
         try:
             h = wr()
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 
+@lru_cache(maxsize=None)
 def get_venv_name() -> str:
     """Returns the name of the current venv or Python name."""
     return Path(sys.prefix).name
@@ -18,6 +18,12 @@ setup(
     author_email="info@quali.com",
     packages=find_packages(),
     install_requires=required,
+    extras_require={"zstd": ["zstandard"]},
+    entry_points={
+        "console_scripts": [
+            "cloudshell-logging-janitor=cloudshell.logging.janitor:main",
+        ]
+    },
     python_requires="~=3.7",
     tests_require=required_for_tests,
     version=version_from_file,
@@ -0,0 +1,29 @@
+"""Run benchmarks and print results as JSON.
+
+python -m tests.benchmarks [--scale 0.1] [--output results.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+from .benchmarks import run_benchmarks
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--output", help="file to save results, stdout by default")
+    args = parser.parse_args(argv)
+
+    results = json.dumps(run_benchmarks(args.scale), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(results)
+    else:
+        sys.stdout.write(results + "\n")
+
+
+if __name__ == "__main__":
+    main()
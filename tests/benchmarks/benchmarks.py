@@ -0,0 +1,193 @@
+"""Benchmarks of cloudshell.logging hot paths.
+
+Every benchmark returns a list of results, a result is a dict with a name,
+parameters and timings, so they can be compared between releases.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import copy_context
+from pathlib import Path
+from typing import Callable
+
+from cloudshell.logging import qs_logger
+from cloudshell.logging.context_filters import set_logger_context
+from cloudshell.logging.file_handlers import FileHandler
+from cloudshell.logging.memory_handler import CompactMemoryHandler, LimitedMemoryHandler
+
+CATEGORY = "benchmarks"
+VERSION_PATH = Path(__file__).parents[2] / "version.txt"
+
+
+def _result(name: str, params: dict, iterations: int, seconds: float) -> dict:
+    return {
+        "name": name,
+        "params": params,
+        "iterations": iterations,
+        "seconds": seconds,
+        "ops_per_sec": iterations / seconds if seconds else None,
+        "us_per_op": seconds / iterations * 10**6 if iterations else None,
+    }
+
+
+def _measure(fn: Callable[[], None], iterations: int, repeat: int = 3) -> float:
+    """Return the best time of running fn iterations times."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+@contextmanager
+def _log_path():
+    """Temporary LOG_PATH, loggers are closed on exit."""
+    old_log_path = os.environ.get("LOG_PATH")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["LOG_PATH"] = tmp_dir
+        try:
+            yield tmp_dir
+        finally:
+            logger = logging.getLogger(CATEGORY)
+            for hdlr in logger.handlers:
+                hdlr.close()
+            logger.handlers.clear()
+            qs_logger._LOGGER_CONTAINER.clear()
+            if old_log_path is None:
+                del os.environ["LOG_PATH"]
+            else:
+                os.environ["LOG_PATH"] = old_log_path
+
+
+def _get_logger(group) -> logging.Logger:
+    return qs_logger.get_qs_logger(log_group=str(group), log_category=CATEGORY)
+
+
+def bench_get_qs_logger_cold(iterations: int, groups: int) -> list[dict]:
+    """Create a new log group when there are `groups` live ones."""
+    with _log_path():
+        for group in range(groups):
+            _get_logger(group)
+        names = iter(range(groups, groups + iterations))
+        seconds = _measure(lambda: _get_logger(next(names)), iterations, repeat=1)
+    return [_result("get_qs_logger_cold", {"groups": groups}, iterations, seconds)]
+
+
+def bench_get_qs_logger_warm(iterations: int, groups: int, threads: int) -> list[dict]:
+    """Get existing loggers from several threads."""
+    with _log_path():
+        for group in range(groups):
+            _get_logger(group)
+
+        def worker(group):
+            for _ in range(iterations):
+                _get_logger(group)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            wait([executor.submit(worker, i % groups) for i in range(threads)])
+        seconds = time.perf_counter() - start
+    params = {"groups": groups, "threads": threads}
+    return [_result("get_qs_logger_warm", params, iterations * threads, seconds)]
+
+
+def bench_log_record(iterations: int, groups: int, threads: int) -> list[dict]:
+    """Log a record through the dispatcher, formatter and file handler."""
+    with _log_path():
+        for group in range(groups):
+            logger = _get_logger(group)
+
+        def worker(group):
+            set_logger_context(str(group), "QS")
+            for i in range(iterations):
+                logger.info("message %d with\nseveral lines", i)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            futures = [
+                executor.submit(copy_context().run, worker, i % groups)
+                for i in range(threads)
+            ]
+            wait(futures)
+        seconds = time.perf_counter() - start
+    params = {"groups": groups, "threads": threads}
+    return [_result("log_record", params, iterations * threads, seconds)]
+
+
+def bench_normalize_buffer(iterations: int, size: int) -> list[dict]:
+    """Clear ANSI-laden device output and a plain ASCII message."""
+    line = "\x1b[1;32mGigabitEthernet0/1\x1b[0m is up, line protocol is up\r\n"
+    buffer = line * (size // len(line) + 1)
+    plain = "plain ascii message " * (size // 20 + 1)
+    results = []
+    for name, value in (("ansi", buffer), ("plain", plain)):
+        seconds = _measure(lambda: qs_logger.normalize_buffer(value), iterations)
+        params = {"size": len(value), "buffer": name}
+        results.append(_result("normalize_buffer", params, iterations, seconds))
+    return results
+
+
+def bench_memory_handler(iterations: int, max_len: int) -> list[dict]:
+    """Emit records to memory handlers and flush them to the debug file."""
+    formatter = qs_logger.MultiLineFormatter(qs_logger.DEFAULT_FORMAT)
+    # the formatted text is cached in the record, a new record is emitted
+    # every time so the flush formats all buffered records
+    fields = {"msg": "device output %s", "args": ("x" * 100,), "levelno": logging.DEBUG}
+    handler_classes = {
+        "records": LimitedMemoryHandler,
+        "compact": CompactMemoryHandler,
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, cls in handler_classes.items():
+            # the flush formats the buffered records and writes them
+            target = FileHandler(os.path.join(tmp_dir, f"{name}-debug.log"))
+            target.setFormatter(formatter)
+            handler = cls(max_len, target)
+            seconds = _measure(
+                lambda: handler.emit(logging.makeLogRecord(fields)), iterations
+            )
+            params = {"max_len": max_len, "mode": name}
+            results.append(_result("memory_handler_emit", params, iterations, seconds))
+
+            seconds = _measure(handler.flush, 1, repeat=1)
+            results.append(_result("memory_handler_flush", params, 1, seconds))
+            handler.close()
+            target.close()
+    return results
+
+
+def run_benchmarks(scale: float = 1.0) -> dict:
+    """Run all benchmarks, scale changes the number of iterations."""
+
+    def n(iterations):
+        return max(int(iterations * scale), 1)
+
+    results = []
+    for groups in (1, 100, 1000):
+        results += bench_get_qs_logger_cold(n(100), groups)
+    for groups in (1, 100):
+        for threads in (1, 8):
+            results += bench_get_qs_logger_warm(n(10000), groups, threads)
+            results += bench_log_record(n(2000), groups, threads)
+    for size in (1024, 1024 * 1024):
+        results += bench_normalize_buffer(n(10 * 1024 * 1024 // size), size)
+    results += bench_memory_handler(n(10000), 500)
+
+    return {
+        "version": VERSION_PATH.read_text().strip(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import json
+
+from .__main__ import main
+
+
+def test_benchmarks_results(tmp_path):
+    output = tmp_path / "results.json"
+
+    main(["--scale", "0.001", "--output", str(output)])
+
+    results = json.loads(output.read_text())
+    assert results["version"]
+    names = {result["name"] for result in results["results"]}
+    assert names == {
+        "get_qs_logger_cold",
+        "get_qs_logger_warm",
+        "log_record",
+        "normalize_buffer",
+        "memory_handler_emit",
+        "memory_handler_flush",
+    }
+    for result in results["results"]:
+        assert result["iterations"] > 0
+        assert result["seconds"] >= 0
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from logging import DEBUG, INFO, Handler, getLogger, makeLogRecord
+
+import pytest
+
+from cloudshell.logging.async_handler import AsyncHandler, AsyncWriter, OverflowPolicy
+
+
+class ListHandler(Handler):
+    def __init__(self):
+        super().__init__()
+        self.buffer = []
+        self.closed = False
+
+    def emit(self, record):
+        self.buffer.append(record)
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+class BlockingHandler(ListHandler):
+    def __init__(self):
+        super().__init__()
+        self.event = threading.Event()
+
+    def emit(self, record):
+        self.event.wait()
+        super().emit(record)
+
+
+@pytest.fixture()
+def logger():
+    logger = getLogger(__name__)
+    logger.setLevel(DEBUG)
+    yield logger
+    logger.handlers.clear()
+
+
+def _fill_queue(logger, target, writer):
+    # the first record is taken by the writer thread and blocks it
+    logger.info("blocker")
+    while writer._queue:
+        pass
+    for i in range(writer.max_size):
+        logger.info(str(i))
+
+
+def test_async_handler_writes_records(logger):
+    writer = AsyncWriter()
+    target = ListHandler()
+    handler = AsyncHandler(target, writer)
+    logger.addHandler(handler)
+
+    logger.info("%s message", "first")
+    logger.info("second message")
+    handler.flush()
+
+    assert [r.msg for r in target.buffer] == ["first message", "second message"]
+    writer.stop()
+
+
+def test_async_handler_close_drains_queue(logger):
+    writer = AsyncWriter()
+    target = ListHandler()
+    handler = AsyncHandler(target, writer)
+    logger.addHandler(handler)
+
+    logger.info("1")
+    handler.close()
+
+    assert handler.target is None
+    assert target.closed
+    assert [r.msg for r in target.buffer] == ["1"]
+    writer.stop()
+
+
+def test_overflow_policy_drop(logger):
+    writer = AsyncWriter(max_size=2, policy=OverflowPolicy.DROP)
+    target = BlockingHandler()
+    logger.addHandler(AsyncHandler(target, writer))
+
+    _fill_queue(logger, target, writer)
+    logger.info("dropped")
+    logger.debug("dropped")
+    assert writer.dropped == 2
+
+    target.event.set()
+    logger.error("error")
+    writer.drain()
+
+    assert [r.msg for r in target.buffer] == ["blocker", "0", "1", "error"]
+    writer.stop()
+
+
+def test_overflow_policy_drop_skips_message_formatting(logger):
+    class Arg:
+        formatted = False
+
+        def __str__(self):
+            self.formatted = True
+            return "arg"
+
+    writer = AsyncWriter(max_size=2, policy=OverflowPolicy.DROP)
+    target = BlockingHandler()
+    handler = AsyncHandler(target, writer)
+    logger.addHandler(handler)
+
+    _fill_queue(logger, target, writer)
+    arg = Arg()
+    record = makeLogRecord({"msg": "dropped %s", "args": (arg,), "levelno": INFO})
+    handler.handle(record)
+
+    assert writer.dropped == 1
+    assert not arg.formatted
+    target.event.set()
+    writer.stop()
+
+
+def test_overflow_policy_block_drops_in_event_loop(logger):
+    writer = AsyncWriter(max_size=2, policy=OverflowPolicy.BLOCK)
+    target = BlockingHandler()
+    logger.addHandler(AsyncHandler(target, writer))
+    _fill_queue(logger, target, writer)
+
+    async def log():
+        logger.info("dropped")
+
+    asyncio.run(log())
+    assert writer.dropped == 1
+
+    target.event.set()
+    writer.drain()
+    assert [r.msg for r in target.buffer] == ["blocker", "0", "1"]
+    writer.stop()
+
+
+def test_overflow_policy_sample(logger):
+    writer = AsyncWriter(max_size=2, policy=OverflowPolicy.SAMPLE, sample_rate=3)
+    target = BlockingHandler()
+    logger.addHandler(AsyncHandler(target, writer))
+
+    _fill_queue(logger, target, writer)
+    logger.info("dropped")
+    logger.info("dropped")
+    assert writer.dropped == 2
+
+    target.event.set()
+    logger.info("sampled")
+    writer.drain()
+
+    assert [r.msg for r in target.buffer][-1] == "sampled"
+    writer.stop()
+
+
+def test_async_handler_keeps_shared_record():
+    writer = AsyncWriter()
+    target = ListHandler()
+    handler = AsyncHandler(target, writer)
+    record = makeLogRecord({"msg": "%s message", "args": ("first",)})
+
+    handler.handle(record)
+    handler.flush()
+
+    assert record.msg == "%s message"
+    assert record.args == ("first",)
+    assert target.buffer[0].getMessage() == "first message"
+    writer.stop()
+
+
+def test_writer_survives_target_errors(logger):
+    class FailingHandler(ListHandler):
+        def emit(self, record):
+            if record.msg == "fail":
+                raise RuntimeError(record.msg)
+            super().emit(record)
+
+    writer = AsyncWriter()
+    target = FailingHandler()
+    handler = AsyncHandler(target, writer)
+    errors = []
+    handler.handleError = errors.append
+    logger.addHandler(handler)
+
+    logger.info("fail")
+    logger.info("written")
+
+    assert writer.drain(timeout=5)
+    assert [r.msg for r in errors] == ["fail"]
+    assert [r.msg for r in target.buffer] == ["written"]
+    writer.stop()
+
+
+def test_writer_stop_writes_queued_records(logger):
+    writer = AsyncWriter()
+    target = ListHandler()
+    logger.addHandler(AsyncHandler(target, writer))
+
+    logger.info("1")
+    writer.stop()
+    logger.info("2")
+
+    assert [r.msg for r in target.buffer] == ["1", "2"]
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        AsyncWriter(policy="unknown")
+
+
+def test_async_handler_sets_target_formatter():
+    writer = AsyncWriter()
+    target = Handler()
+    handler = AsyncHandler(target, writer)
+    formatter = object()
+
+    handler.setFormatter(formatter)
+
+    assert target.formatter is formatter
+    writer.stop()
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from contextvars import Context
+
+from cloudshell.logging.asyncio_context import (
+    get_qs_logger_async,
+    run_in_executor,
+    set_log_context_task_factory,
+)
+from cloudshell.logging.context_filters import get_logger_context, set_logger_context
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_task_factory_sets_default_context():
+    async def get_context():
+        return get_logger_context()
+
+    async def main():
+        set_log_context_task_factory("default", "QS")
+        loop = asyncio.get_running_loop()
+        # task created by the loop without the log context
+        future = loop.create_future()
+        loop.call_soon(
+            lambda: future.set_result(loop.create_task(get_context())),
+            context=Context(),
+        )
+        default_context = await (await future)
+
+        set_logger_context("r1", "resource")
+        own_context = await asyncio.create_task(get_context())
+        return default_context, own_context
+
+    assert Context().run(_run, main()) == (("default", "QS"), ("r1", "resource"))
+
+
+def test_run_in_executor_passes_context():
+    async def main():
+        set_logger_context("r1", "resource")
+        return await run_in_executor(
+            lambda: (get_logger_context(), threading.current_thread())
+        )
+
+    context, thread = Context().run(_run, main())
+    assert context == ("r1", "resource")
+    assert thread is not threading.current_thread()
+
+
+def test_get_qs_logger_async(monkeypatch):
+    calls = []
+
+    def get_qs_logger(*args):
+        calls.append(threading.current_thread())
+        return "logger"
+
+    monkeypatch.setattr(
+        "cloudshell.logging.asyncio_context.get_qs_logger", get_qs_logger
+    )
+
+    async def main():
+        logger = await get_qs_logger_async("r1", log_file_prefix="resource")
+        return logger, get_logger_context()
+
+    assert Context().run(_run, main()) == ("logger", ("r1", "resource"))
+    assert calls[0] is not threading.current_thread()
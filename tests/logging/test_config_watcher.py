@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import sys
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from cloudshell.logging.config_watcher import ConfigWatcher
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture()
+def config_path(tmp_path):
+    path = tmp_path / "qs_config.ini"
+    path.write_text("[Logging]\nLOG_LEVEL='INFO'\n")
+    return path
+
+
+def test_check_calls_on_change_only_on_change(config_path):
+    on_change = MagicMock()
+    watcher = ConfigWatcher(lambda: str(config_path), on_change, use_inotify=False)
+
+    assert not watcher.check()
+    config_path.write_text("[Logging]\nLOG_LEVEL='DEBUG'\n")
+    assert watcher.check()
+    assert not watcher.check()
+    assert on_change.call_count == 1
+
+
+def test_check_path_changed(config_path, tmp_path):
+    other_path = tmp_path / "other.ini"
+    other_path.write_text("[Logging]\n")
+    paths = [str(config_path)]
+    on_change = MagicMock()
+    watcher = ConfigWatcher(lambda: paths[0], on_change, use_inotify=False)
+
+    paths[0] = str(other_path)
+    assert watcher.check()
+    on_change.assert_called_once_with()
+
+
+def test_check_on_change_error(config_path):
+    on_change = MagicMock(side_effect=ValueError("bad config"))
+    watcher = ConfigWatcher(lambda: str(config_path), on_change, use_inotify=False)
+
+    config_path.unlink()
+    assert watcher.check()
+    assert watcher.changes == 1
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watch_in_background(config_path, use_inotify):
+    on_change = MagicMock()
+    watcher = ConfigWatcher(
+        lambda: str(config_path), on_change, interval=0.05, use_inotify=use_inotify
+    )
+    watcher.start()
+    try:
+        if use_inotify and sys.platform.startswith("linux"):
+            assert watcher.uses_inotify
+        # the editor replaces the file
+        tmp_path = config_path.with_suffix(".tmp")
+        tmp_path.write_text("[Logging]\nLOG_LEVEL='DEBUG'\n")
+        tmp_path.replace(config_path)
+
+        assert _wait_for(lambda: on_change.call_count == 1)
+    finally:
+        watcher.stop(timeout=5)
+    assert not watcher._thread.is_alive()
+    assert not watcher.uses_inotify
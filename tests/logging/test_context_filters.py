@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import logging
+from contextvars import Context
+
+from cloudshell.logging.context_filters import (
+    FilterByContext,
+    FilterOnlyWithoutContext,
+    ResolveContextFilter,
+    resolve_record_context,
+    set_logger_context,
+)
+
+
+def _record():
+    return logging.makeLogRecord({"msg": "message"})
+
+
+def test_resolve_record_context_once():
+    record = _record()
+    context = Context()
+    context.run(set_logger_context, "r1", "QS")
+
+    assert context.run(resolve_record_context, record) == ("r1", "QS")
+    # other threads and contexts get the context of the record
+    assert Context().run(resolve_record_context, record) == ("r1", "QS")
+
+
+def test_resolve_record_without_context():
+    record = _record()
+
+    assert Context().run(resolve_record_context, record) is None
+    assert record.log_context is None
+    context = Context()
+    context.run(set_logger_context, "r1", "QS")
+    assert context.run(resolve_record_context, record) is None
+
+
+def test_context_filters():
+    with_context = _record()
+    without_context = _record()
+    context = Context()
+    context.run(set_logger_context, "r1", "QS")
+    context.run(ResolveContextFilter().filter, with_context)
+    Context().run(ResolveContextFilter().filter, without_context)
+
+    assert FilterByContext("", "r1", "QS").filter(with_context)
+    assert not FilterByContext("", "r2", "QS").filter(with_context)
+    assert not FilterByContext("", "r1", "QS").filter(without_context)
+    assert not FilterOnlyWithoutContext().filter(with_context)
+    assert FilterOnlyWithoutContext().filter(without_context)
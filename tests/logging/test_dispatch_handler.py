@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import threading
+from contextvars import copy_context
+from logging import DEBUG, ERROR, INFO, getLogger
+from logging.handlers import BufferingHandler
+
+import pytest
+
+from cloudshell.logging.context_filters import set_logger_context
+from cloudshell.logging.dispatch_handler import ContextDispatchHandler
+from cloudshell.logging.file_handlers import FileHandler
+
+
+@pytest.fixture()
+def dispatcher():
+    return ContextDispatchHandler()
+
+
+@pytest.fixture()
+def logger(dispatcher):
+    logger = getLogger(__name__)
+    logger.setLevel(DEBUG)
+    logger.addHandler(dispatcher)
+    yield logger
+    logger.removeHandler(dispatcher)
+
+
+def _log_in_context(logger, folder_name, file_prefix, msg):
+    def log():
+        set_logger_context(folder_name, file_prefix)
+        logger.info(msg)
+
+    copy_context().run(log)
+
+
+def test_dispatch_by_context(logger, dispatcher):
+    handler1 = BufferingHandler(10)
+    handler2 = BufferingHandler(10)
+    dispatcher.add_route("r1", "QS", [handler1])
+    dispatcher.add_route("r2", "QS", [handler2])
+
+    _log_in_context(logger, "r1", "QS", "1")
+    _log_in_context(logger, "r2", "QS", "2")
+    _log_in_context(logger, "r2", "unknown", "3")
+
+    assert [r.msg for r in handler1.buffer] == ["1"]
+    assert [r.msg for r in handler2.buffer] == ["2"]
+    assert handler2.buffer[0].log_context == ("r2", "QS")
+
+
+def test_dispatch_without_context(logger, dispatcher):
+    handler = BufferingHandler(10)
+    dispatcher.add_route("r1", "QS", [handler])
+
+    copy_context().run(logger.info, "1")
+
+    assert not handler.buffer
+
+
+def test_dispatch_respects_handler_level(logger, dispatcher):
+    handler = BufferingHandler(10)
+    handler.setLevel(INFO)
+    dispatcher.add_route("r1", "QS", [handler])
+
+    def log():
+        set_logger_context("r1", "QS")
+        logger.debug("1")
+        logger.info("2")
+
+    copy_context().run(log)
+
+    assert [r.msg for r in handler.buffer] == ["2"]
+
+
+def test_route_level_overrides_handler_levels(logger, dispatcher):
+    handler = BufferingHandler(10)
+    handler.setLevel(INFO)
+    memory_handler = BufferingHandler(10)
+    dispatcher.add_route("r1", "QS", [handler, memory_handler])
+    dispatcher.set_route_level("r1", "QS", ERROR)
+
+    _log_in_context(logger, "r1", "QS", "1")
+    assert not handler.buffer
+    # handlers without level get all records
+    assert len(memory_handler.buffer) == 1
+
+    dispatcher.set_route_level("r1", "QS", None)
+    _log_in_context(logger, "r1", "QS", "2")
+    assert [r.msg for r in handler.buffer] == ["2"]
+
+
+def test_route_level_kept_for_retired_route(dispatcher):
+    dispatcher.add_route("r1", "QS", [], factory=lambda: [])
+    dispatcher.set_route_level("r1", "QS", DEBUG)
+    dispatcher.retire_route("r1", "QS")
+
+    assert dispatcher.get_route_keys("r1") == [("r1", "QS")]
+    assert dispatcher.get_route_level("r1", "QS") == DEBUG
+
+
+def test_remove_route(dispatcher):
+    handler = BufferingHandler(10)
+    dispatcher.add_route("r1", "QS", [handler])
+
+    assert dispatcher.remove_route("r1", "QS") == (handler,)
+    assert dispatcher.get_handlers("r1", "QS") == ()
+    assert dispatcher.handlers == []
+
+
+def test_close_closes_routed_handlers(dispatcher):
+    handler = BufferingHandler(10)
+    handler.buffer.append("record")
+    dispatcher.add_route("r1", "QS", [handler])
+
+    dispatcher.close()
+
+    assert not handler.buffer
+    assert dispatcher.handlers == []
+
+
+def test_retire_and_restore_route(logger, dispatcher):
+    handler1 = BufferingHandler(10)
+    handler2 = BufferingHandler(10)
+    handlers = iter([handler2])
+    dispatcher.add_route("r1", "QS", [handler1], factory=lambda: [next(handlers)])
+
+    assert dispatcher.retire_route("r1", "QS") == (handler1,)
+    assert dispatcher.handlers == []
+
+    _log_in_context(logger, "r1", "QS", "1")
+
+    assert dispatcher.get_handlers("r1", "QS") == (handler2,)
+    assert [r.msg for r in handler2.buffer] == ["1"]
+
+
+def test_retire_route_without_factory(logger, dispatcher):
+    dispatcher.add_route("r1", "QS", [BufferingHandler(10)])
+    dispatcher.retire_route("r1", "QS")
+
+    assert not dispatcher.restore_route("r1", "QS")
+
+
+def test_set_factory_of_retired_route(dispatcher):
+    handler = BufferingHandler(10)
+    dispatcher.add_route("r1", "QS", [], factory=lambda: [])
+    dispatcher.retire_route("r1", "QS")
+
+    dispatcher.set_factory("r1", "QS", lambda: [handler])
+    assert dispatcher.is_retired("r1", "QS")
+    assert dispatcher.restore_route("r1", "QS")
+    assert dispatcher.get_handlers("r1", "QS") == (handler,)
+
+    dispatcher.retire_route("r1", "QS")
+    dispatcher.set_factory("r1", "QS", None)
+    assert dispatcher.get_route_keys() == []
+
+
+def test_get_idle_routes(dispatcher, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(
+        "cloudshell.logging.dispatch_handler.time.monotonic", lambda: now[0]
+    )
+    dispatcher.add_route("r1", "QS", [])
+    now[0] = 110
+    dispatcher.add_route("r2", "QS", [])
+    now[0] = 120
+    dispatcher.add_route("r3", "QS", [])
+    now[0] = 130
+    dispatcher.touch("r1", "QS")
+
+    assert dispatcher.get_idle_routes(idle_timeout=20) == [("r2", "QS")]
+    assert dispatcher.get_idle_routes(max_routes=1) == [("r2", "QS"), ("r3", "QS")]
+    assert dispatcher.get_idle_routes() == []
+
+
+def test_get_idle_routes_skips_removed_routes(dispatcher):
+    dispatcher.add_route("r1", "QS", [])
+    dispatcher.add_route("r2", "QS", [])
+    dispatcher.remove_route("r1", "QS")
+
+    dispatcher.touch("r1", "QS")
+    dispatcher.remove_route("r2", "QS")
+    # the time set by emit in another thread after the route was removed
+    dispatcher._last_used[("r2", "QS")] = 0
+
+    assert dispatcher.get_idle_routes(max_routes=1) == []
+    assert dispatcher._last_used == {}
+
+
+def test_close_handlers_waits_for_emitted_records(logger, dispatcher):
+    entered = threading.Event()
+    release = threading.Event()
+    closed_with = []
+
+    class BlockingHandler(BufferingHandler):
+        def emit(self, record):
+            entered.set()
+            release.wait(5)
+            super().emit(record)
+
+        def close(self):
+            closed_with.extend(r.msg for r in self.buffer)
+            super().close()
+
+    dispatcher.add_route("r1", "QS", [BlockingHandler(10)])
+    emitting = threading.Thread(target=_log_in_context, args=(logger, "r1", "QS", "1"))
+    emitting.start()
+    entered.wait(5)
+    closing = threading.Thread(
+        target=dispatcher.close_handlers,
+        args=(dispatcher.remove_route("r1", "QS"),),
+    )
+    closing.start()
+    closing.join(0.1)
+    assert closing.is_alive()
+
+    release.set()
+    emitting.join(5)
+    closing.join(5)
+    assert closed_with == ["1"]
+
+
+def test_closed_handlers_arent_reopened(logger, dispatcher, tmp_path):
+    log_path = tmp_path / "r1.log"
+    dispatcher.add_route("r1", "QS", [FileHandler(log_path, delay=True)])
+    # routes read by a thread before the route is removed
+    routes = dispatcher._routes
+    dispatcher.close_handlers(dispatcher.remove_route("r1", "QS"))
+    dispatcher._routes = routes
+
+    _log_in_context(logger, "r1", "QS", "1")
+
+    assert not log_path.exists()
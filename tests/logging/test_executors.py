@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+from contextvars import Context
+
+import pytest
+
+from cloudshell.logging.context_filters import get_logger_context, set_logger_context
+from cloudshell.logging.executors import (
+    LogContextProcessPoolExecutor,
+    LogContextThreadPoolExecutor,
+)
+from cloudshell.logging.qs_logger import get_qs_logger
+
+CATEGORY = "test_executors"
+
+
+class ContextHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.getMessage(), get_logger_context()))
+
+
+@pytest.fixture()
+def handler():
+    logger = logging.getLogger(CATEGORY)
+    logger.setLevel(logging.INFO)
+    handler = ContextHandler()
+    logger.addHandler(handler)
+    yield handler
+    logger.removeHandler(handler)
+
+
+def _log_task(num):
+    logger = logging.getLogger(CATEGORY)
+    logger.debug("debug %s", num)
+    logger.info("task %s", num)
+    return os.getpid()
+
+
+def _get_qs_logger_task(num):
+    logger = get_qs_logger(f"r{num}", CATEGORY)
+    logger.info("task %s", num)
+    return [type(hdlr).__name__ for hdlr in logger.handlers]
+
+
+def _submit_in_context(executor, log_group, num):
+    set_logger_context(log_group, "QS")
+    return executor.submit(_log_task, num)
+
+
+def test_thread_pool_passes_context_of_submit(handler):
+    with LogContextThreadPoolExecutor(max_workers=1) as executor:
+        futures = [
+            Context().run(_submit_in_context, executor, f"r{num}", num)
+            for num in range(3)
+        ]
+        for future in futures:
+            future.result()
+
+    assert handler.records == [
+        ("task 0", ("r0", "QS")),
+        ("task 1", ("r1", "QS")),
+        ("task 2", ("r2", "QS")),
+    ]
+
+
+def test_process_pool_forwards_records(handler):
+    executor = LogContextProcessPoolExecutor(
+        max_workers=2,
+        mp_context=multiprocessing.get_context("spawn"),
+        log_categories=(CATEGORY,),
+    )
+    with executor:
+        futures = [
+            Context().run(_submit_in_context, executor, f"r{num}", num)
+            for num in range(4)
+        ]
+        pids = {future.result(timeout=60) for future in futures}
+        futures.append(Context().run(executor.submit, _log_task, 4))
+        futures[-1].result(timeout=60)
+
+    assert os.getpid() not in pids
+    assert sorted(handler.records) == [
+        ("task 0", ("r0", "QS")),
+        ("task 1", ("r1", "QS")),
+        ("task 2", ("r2", "QS")),
+        ("task 3", ("r3", "QS")),
+        ("task 4", None),
+    ]
+
+
+def test_process_pool_get_qs_logger_forwards_records(handler):
+    executor = LogContextProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        log_categories=(CATEGORY,),
+    )
+    with executor:
+        handlers = executor.submit(_get_qs_logger_task, 0).result(timeout=60)
+
+    # files aren't opened in the worker, records are written once by the parent
+    assert handlers == ["ForwardingHandler"]
+    assert handler.records == [("task 0", ("r0", "QS"))]
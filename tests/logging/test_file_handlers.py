@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import os
+import time
+from logging import DEBUG, getLogger
+
+import pytest
+
+from cloudshell.logging.file_handlers import BufferedFileHandler, FileHandler
+from cloudshell.logging.memory_handler import LimitedMemoryHandler
+
+
+@pytest.fixture()
+def logger():
+    logger = getLogger(__name__)
+    logger.setLevel(DEBUG)
+    yield logger
+    for handler in logger.handlers:
+        handler.close()
+    logger.handlers.clear()
+
+
+@pytest.fixture()
+def log_path(tmp_path):
+    return tmp_path / "test.log"
+
+
+def test_file_handler_recreates_removed_directory(logger, tmp_path):
+    log_path = tmp_path / "removed" / "test.log"
+    logger.addHandler(FileHandler(log_path, delay=True))
+
+    logger.info("1")
+
+    assert log_path.read_text() == "1\n"
+
+
+def test_buffered_handler_keeps_records(logger, log_path):
+    logger.addHandler(BufferedFileHandler(log_path, flush_interval=60000))
+
+    logger.info("1")
+    logger.info("2")
+
+    assert log_path.read_text() == ""
+
+
+def test_buffered_handler_delay_doesnt_create_file(logger, log_path):
+    logger.addHandler(BufferedFileHandler(log_path, delay=True, flush_interval=60000))
+
+    logger.info("1")
+
+    assert not log_path.exists()
+
+
+def test_buffered_handler_flushes_on_error(logger, log_path):
+    logger.addHandler(BufferedFileHandler(log_path, flush_interval=60000))
+
+    logger.info("1")
+    logger.error("2")
+
+    assert log_path.read_text() == "1\n2\n"
+
+
+def test_buffered_handler_flushes_on_size(logger, log_path):
+    logger.addHandler(BufferedFileHandler(log_path, flush_bytes=4))
+
+    logger.info("1")
+    assert log_path.read_text() == ""
+    logger.info("2")
+    assert log_path.read_text() == "1\n2\n"
+
+
+def test_buffered_handler_flushes_by_time(logger, log_path):
+    logger.addHandler(BufferedFileHandler(log_path, flush_interval=50))
+
+    logger.info("1")
+    for _ in range(100):
+        if log_path.read_text():
+            break
+        time.sleep(0.01)
+
+    assert log_path.read_text() == "1\n"
+
+
+def test_buffered_handler_flushes_on_close(logger, log_path):
+    handler = BufferedFileHandler(log_path, delay=True, flush_interval=60000)
+    logger.addHandler(handler)
+
+    logger.info("1")
+    handler.close()
+
+    assert log_path.read_text() == "1\n"
+
+
+def test_memory_handler_flushes_to_buffered_handler(logger, log_path):
+    target = BufferedFileHandler(log_path, delay=True, flush_interval=60000)
+    logger.addHandler(LimitedMemoryHandler(10, target))
+
+    logger.debug("1")
+    assert not log_path.exists()
+    logger.error("2")
+
+    assert log_path.read_text() == "1\n2\n"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork isn't available")
+def test_buffered_handler_child_doesnt_write_parent_records(logger, log_path):
+    handler = BufferedFileHandler(log_path, delay=True, flush_interval=60000)
+    logger.addHandler(handler)
+    logger.info("before fork")
+
+    pid = os.fork()
+    if pid == 0:
+        logger.info("child")
+        handler.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    handler.flush()
+
+    assert sorted(log_path.read_text().splitlines()) == ["before fork", "child"]
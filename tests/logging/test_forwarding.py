@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+from contextvars import Context
+from multiprocessing.connection import Client
+
+import pytest
+
+from cloudshell.logging.context_filters import set_logger_context
+from cloudshell.logging.forwarding import (
+    ADDRESS_ENV,
+    BatchForwardingHandler,
+    ForwardingServer,
+    get_parent_address,
+)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture()
+def server():
+    records = []
+    server = ForwardingServer(handle=records.append)
+    server.records = records
+    yield server
+    server.close()
+
+
+def _fail_unpickling():
+    raise ImportError("class of the child")
+
+
+class Unpicklable:
+    def __reduce__(self):
+        return _fail_unpickling, ()
+
+
+def _log(handler, msg, level=logging.INFO, exc_info=None, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, None, exc_info)
+    record.__dict__.update(extra)
+    handler.handle(record)
+
+
+def test_server_address_in_environment(server):
+    assert os.environ[ADDRESS_ENV] == f"{os.getpid()}:{server.address}"
+    # the server of this process isn't a parent
+    assert get_parent_address() is None
+
+    server.close()
+    assert ADDRESS_ENV not in os.environ
+
+
+def test_records_sent_in_batches(server):
+    handler = BatchForwardingHandler(
+        server.address, server._authkey, batch_size=3, flush_interval=60000
+    )
+    try:
+        _log(handler, "1")
+        _log(handler, "2")
+        time.sleep(0.1)
+        assert server.records == []
+
+        _log(handler, "3")
+        assert _wait_for(lambda: len(server.records) == 3)
+        assert [r.msg for r in server.records] == ["1", "2", "3"]
+    finally:
+        handler.close()
+
+
+def test_error_record_sent_with_context_and_traceback(server):
+    handler = BatchForwardingHandler(server.address, server._authkey)
+    try:
+        raise ValueError("error")
+    except ValueError:
+        exc_info = sys.exc_info()
+    try:
+        context = Context()
+        context.run(set_logger_context, "r1", "QS")
+        context.run(_log, handler, "failed", logging.ERROR, exc_info)
+
+        assert _wait_for(lambda: len(server.records) == 1)
+        record = server.records[0]
+        assert record.log_context == ("r1", "QS")
+        assert record.exc_info is None
+        assert "ValueError: error" in record.exc_text
+    finally:
+        handler.close()
+
+
+def test_records_dropped_without_parent(server):
+    handler = BatchForwardingHandler(server.address, server._authkey)
+    server.close()
+    try:
+        _log(handler, "lost", logging.ERROR)
+        assert handler.dropped == 1
+    finally:
+        handler.close()
+
+
+def test_records_with_unpicklable_attributes_sent(server):
+    handler = BatchForwardingHandler(server.address, server._authkey)
+    lock = threading.Lock()
+    try:
+        _log(handler, "1")
+        _log(handler, "2", lock=lock)
+        _log(handler, "3", logging.ERROR)
+
+        assert _wait_for(lambda: len(server.records) == 3)
+        assert [r.msg for r in server.records] == ["1", "2", "3"]
+        assert server.records[1].lock == repr(lock)
+        assert handler.dropped == 0
+    finally:
+        handler.close()
+
+
+def test_server_reads_batches_after_unpickling_error(server, caplog):
+    record = logging.makeLogRecord({"msg": "1"})
+    with Client(server.address, authkey=server._authkey) as conn:
+        conn.send([Unpicklable()])
+        conn.send([Unpicklable()])
+        conn.send([record])
+
+        assert _wait_for(lambda: len(server.records) == 1)
+    assert server.records[0].msg == "1"
+    assert server.received == 1
+    assert caplog.text.count("Failed to unpickle forwarded records") == 1
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import gzip
+import os
+import time
+
+import pytest
+
+from cloudshell.logging.file_handlers import FileHandler
+from cloudshell.logging.janitor import DAY, Janitor, main
+
+
+def _create_file(path, size, age_days):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age_days * DAY
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture()
+def root(tmp_path):
+    _create_file(tmp_path / "r1" / "venv" / "QS--1.log", 100, 10)
+    _create_file(tmp_path / "r1" / "venv" / "QS--2.log", 100, 3)
+    _create_file(tmp_path / "r2" / "venv" / "QS--1.log", 100, 5)
+    _create_file(tmp_path / "r2" / "venv" / "QS--2.log", 100, 0)
+    _create_file(tmp_path / "missed_logs.log", 100, 20)
+    return tmp_path
+
+
+def _files(root):
+    return sorted(
+        os.path.relpath(os.path.join(dir_path, name), root)
+        for dir_path, _, names in os.walk(root)
+        for name in names
+    )
+
+
+def test_delete_old_files(root):
+    stats = Janitor(str(root), max_age=4 * DAY).run()
+
+    assert _files(root) == [
+        "r1/venv/QS--2.log",
+        "r2/venv/QS--2.log",
+    ]
+    assert stats["deleted"] == 3
+    assert stats["freed_bytes"] == 300
+
+
+def test_compress_old_files(root):
+    Janitor(str(root), compress_after=4 * DAY).run()
+
+    assert _files(root) == [
+        "missed_logs.log.gz",
+        "r1/venv/QS--1.log.gz",
+        "r1/venv/QS--2.log",
+        "r2/venv/QS--1.log.gz",
+        "r2/venv/QS--2.log",
+    ]
+    with gzip.open(root / "r1" / "venv" / "QS--1.log.gz") as f:
+        assert f.read() == b"x" * 100
+
+
+def test_reservation_quota(root):
+    Janitor(str(root), reservation_max_bytes=150).run()
+
+    assert _files(root) == [
+        "missed_logs.log",
+        "r1/venv/QS--2.log",
+        "r2/venv/QS--2.log",
+    ]
+
+
+def test_root_quota_deletes_oldest_files(root):
+    Janitor(str(root), max_bytes=250).run()
+
+    assert _files(root) == ["r1/venv/QS--2.log", "r2/venv/QS--2.log"]
+
+
+def test_active_files_are_kept(root):
+    Janitor(str(root), max_bytes=1).run()
+
+    # the file was just modified
+    assert _files(root) == ["r2/venv/QS--2.log"]
+
+
+def test_files_of_open_handlers_are_kept(root):
+    path = root / "r1" / "venv" / "QS--1.log"
+    handler = FileHandler(path, delay=True)
+
+    Janitor(str(root), max_age=4 * DAY, compress_after=4 * DAY).run()
+    assert path.exists()
+
+    handler.close()
+    Janitor(str(root), max_age=4 * DAY).run()
+    assert not path.exists()
+
+
+def test_one_janitor_cleans_directory(root):
+    janitor1 = Janitor(str(root), max_age=4 * DAY)
+    janitor2 = Janitor(str(root), max_age=4 * DAY)
+    janitor1.step()
+
+    assert janitor2.step()
+    assert not janitor2.locked
+    with pytest.raises(BlockingIOError):
+        janitor2.run()
+    assert janitor2.stats["rounds"] == 0
+    assert janitor1.run()["deleted"] == 3
+
+    janitor1.close()
+    assert janitor2.run()["rounds"] == 1
+    assert janitor2.locked
+    janitor2.close()
+
+
+def test_empty_reservation_dirs_removed(root):
+    Janitor(str(root), max_age=7 * DAY, active_time=0).run()
+
+    assert not (root / "r1" / "venv" / "QS--1.log").exists()
+    (root / "r1" / "venv" / "QS--2.log").unlink()
+    Janitor(str(root), max_age=7 * DAY, active_time=0).run()
+
+    assert not (root / "r1").exists()
+
+
+def test_step_processes_one_reservation(root):
+    janitor = Janitor(str(root), max_age=4 * DAY)
+
+    assert not janitor.step()
+    assert not janitor.step()
+    assert janitor.step()
+    assert janitor.stats["rounds"] == 1
+
+
+def test_main(root, capsys):
+    main([str(root), "--max-age-days", "4"])
+
+    assert "deleted 3 files" in capsys.readouterr().out
+    assert len(_files(root)) == 2
+
+
+def test_main_reports_locked_directory(root, capsys):
+    janitor = Janitor(str(root), max_age=4 * DAY)
+    janitor.step()
+
+    with pytest.raises(SystemExit) as e:
+        main([str(root), "--max-age-days", "4"])
+
+    assert e.value.code == 1
+    assert "cleaned by another process" in capsys.readouterr().err
+    assert len(_files(root)) == 4
+    janitor.close()
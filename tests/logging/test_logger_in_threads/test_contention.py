@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pytest
+
+from .package_file import do_smth
+
+from cloudshell.logging import qs_logger
+from cloudshell.logging.qs_logger import get_qs_logger
+
+
+class CountingLock:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+
+    def acquire(self, *args, **kwargs):
+        self.acquired += 1
+        return self._lock.acquire(*args, **kwargs)
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def command(folder_name: str, file_prefix: str, calls: int) -> None:
+    for _ in range(calls):
+        _ = get_qs_logger(
+            log_category="tests", log_file_prefix=file_prefix, log_group=folder_name
+        )
+        do_smth(folder_name)
+
+
+def benchmark_get_qs_logger(threads: int, groups: int, calls: int) -> float:
+    """Call get_qs_logger from several threads, return calls per second."""
+    reservation_ids = [str(i) for i in range(groups)]
+    # warm up, create loggers
+    for rid in reservation_ids:
+        command(rid, "resource name", 1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [
+            executor.submit(
+                command, reservation_ids[i % groups], "resource name", calls
+            )
+            for i in range(threads)
+        ]
+        wait(futures)
+    return threads * calls / (time.perf_counter() - start)
+
+
+@pytest.mark.parametrize("threads", [1, 16])
+def test_get_qs_logger_fast_path_without_lock(threads, tmp_path, monkeypatch):
+    os.environ["LOG_PATH"] = str(tmp_path)
+    lock = CountingLock()
+    monkeypatch.setattr(qs_logger, "_LOGGER_LOCK", lock)
+
+    calls_per_sec = benchmark_get_qs_logger(threads, groups=4, calls=200)
+
+    # loggers are created only on warm up
+    assert lock.acquired == 4
+    assert calls_per_sec > 0
+
+
+def test_get_qs_logger_reapplies_changed_settings(tmp_path, monkeypatch):
+    os.environ["LOG_PATH"] = str(tmp_path)
+    logger = get_qs_logger(log_category="tests", log_group="1")
+    file_hdlr = logger.handlers[0].get_handlers("1", "QS")[0]
+
+    monkeypatch.setenv("LOG_LEVEL", "ERROR")
+    get_qs_logger(log_category="tests", log_group="1")
+    assert file_hdlr.level == logging.ERROR
+
+    monkeypatch.setenv("LOG_LEVEL", "DEBUG")
+    get_qs_logger(log_category="tests", log_group="1")
+    assert file_hdlr.level == logging.DEBUG
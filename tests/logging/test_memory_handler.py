@@ -1,18 +1,27 @@
 from __future__ import annotations
 
-from logging import DEBUG, NullHandler, getLogger
+from logging import DEBUG, ERROR, INFO, Formatter, NullHandler, getLogger, makeLogRecord
 from logging.handlers import BufferingHandler
+from unittest.mock import Mock
 
 import pytest
 
-from cloudshell.logging.memory_handler import LimitedMemoryHandler
+from cloudshell.logging.file_handlers import FileHandler
+from cloudshell.logging.memory_handler import (
+    ENTRY_OVERHEAD,
+    RECORD_OVERHEAD,
+    CompactMemoryHandler,
+    LimitedMemoryHandler,
+    MemoryBudget,
+)
 
 
 @pytest.fixture()
 def logger():
     logger = getLogger(__name__)
     logger.setLevel(DEBUG)
-    return logger
+    yield logger
+    logger.handlers.clear()
 
 
 @pytest.fixture()
@@ -97,3 +106,174 @@ def test_limited_memory_handler_flushes_on_close(logger):
     assert buffer_handler.buffer[2].msg == "3"
     # disconnect from target
     assert handler.target is None
+
+
+def test_limited_memory_handler_counts_discarded_records(logger, handler):
+    logger.addHandler(handler)
+
+    for i in range(5):
+        logger.info(str(i))
+    handler.change_max_len(1)
+    handler.close()
+
+    assert handler.discarded == 5
+
+
+def _messages(handler):
+    return [entry.to_record().getMessage() for entry in handler.buffer]
+
+
+def test_compact_memory_handler_keeps_unformatted_entries(logger):
+    formatter = Formatter("%(levelname)s %(message)s")
+    formatter.format = Mock(side_effect=formatter.format)
+    handler = CompactMemoryHandler(max_len=2, target=NullHandler())
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+    logger.info("%s", "1")
+    logger.info("%s-%d", "2", 2)
+    logger.info("3")
+
+    assert _messages(handler) == ["2-2", "3"]
+    assert [entry.levelno for entry in handler.buffer] == [INFO, INFO]
+    assert handler.buffer_size == 2 * ENTRY_OVERHEAD + 5 + 1 + 16 + 1
+    assert handler.discarded == 1
+    formatter.format.assert_not_called()
+
+
+def test_compact_memory_handler_detaches_args_and_exc_info(logger):
+    handler = CompactMemoryHandler(max_len=2, target=NullHandler())
+    logger.addHandler(handler)
+
+    logger.info("%s", [1])
+    try:
+        raise ValueError("error")
+    except ValueError:
+        logger.debug("failed", exc_info=True)
+
+    first, second = (entry.to_record() for entry in handler.buffer)
+    assert (first.msg, first.args) == ("[1]", None)
+    assert second.exc_info is None
+    assert "ValueError: error" in second.exc_text
+
+
+def test_compact_memory_handler_limits_bytes(logger):
+    max_bytes = 2 * ENTRY_OVERHEAD + 5
+    handler = CompactMemoryHandler(
+        max_len=10, target=NullHandler(), max_bytes=max_bytes
+    )
+    logger.addHandler(handler)
+
+    logger.info("12")
+    logger.info("34")
+    logger.info("56")
+    logger.info("too long record" * ENTRY_OVERHEAD)
+
+    assert _messages(handler) == ["34", "56"]
+    assert handler.buffer_size == 2 * ENTRY_OVERHEAD + 4
+    assert handler.discarded == 2
+
+
+def test_compact_memory_handler_change_max_len(logger):
+    handler = CompactMemoryHandler(max_len=10, target=NullHandler())
+    logger.addHandler(handler)
+
+    logger.info("1")
+    logger.info("23")
+    handler.change_max_len(1)
+
+    assert _messages(handler) == ["23"]
+    assert handler.buffer_size == ENTRY_OVERHEAD + 2
+
+
+def test_compact_memory_handler_uses_target_formatter(logger):
+    buffer_handler = BufferingHandler(10)
+    buffer_handler.setFormatter(Formatter("%(levelname)s %(message)s"))
+    handler = CompactMemoryHandler(max_len=10, target=buffer_handler)
+    logger.addHandler(handler)
+
+    logger.info("1")
+
+    assert handler.format(handler.buffer[0].to_record()) == "INFO 1"
+
+
+def test_compact_memory_handler_flushes_on_error(logger, tmp_path):
+    log_path = tmp_path / "test.log"
+    target = FileHandler(log_path, delay=True)
+    target.setFormatter(Formatter("%(levelname)s %(funcName)s %(message)s"))
+    handler = CompactMemoryHandler(max_len=10, target=target)
+    logger.addHandler(handler)
+
+    logger.debug("%d", 1)
+    logger.error("2")
+    target.close()
+
+    assert len(handler.buffer) == 0
+    assert handler.buffer_size == 0
+    func = "test_compact_memory_handler_flushes_on_error"
+    assert log_path.read_text() == f"DEBUG {func} 1\nERROR {func} 2\n"
+
+
+def _record(msg, levelno=INFO):
+    return makeLogRecord({"msg": msg, "levelno": levelno})
+
+
+def test_memory_budget_evicts_oldest_across_handlers(logger):
+    budget = MemoryBudget(max_bytes=3 * ENTRY_OVERHEAD + 6)
+    handler1 = CompactMemoryHandler(max_len=10, target=NullHandler(), budget=budget)
+    handler1.set_name("1")
+    handler2 = CompactMemoryHandler(max_len=10, target=NullHandler(), budget=budget)
+    handler2.set_name("2")
+
+    handler1.handle(_record("11"))
+    handler2.handle(_record("21"))
+    handler2.handle(_record("22"))
+    handler1.handle(_record("12"))
+
+    assert _messages(handler1) == ["12"]
+    assert _messages(handler2) == ["21", "22"]
+    assert budget.usage == 3 * ENTRY_OVERHEAD + 6
+    assert budget.evicted == 1
+    assert budget.get_stats()["handlers"] == {
+        "1": {"usage": ENTRY_OVERHEAD + 2, "evicted": 1, "discarded": 1},
+        "2": {"usage": 2 * ENTRY_OVERHEAD + 4, "evicted": 0, "discarded": 0},
+    }
+
+
+def test_memory_budget_skips_flushed_records(logger):
+    budget = MemoryBudget(max_bytes=2 * ENTRY_OVERHEAD + 4)
+    handler1 = CompactMemoryHandler(max_len=10, target=NullHandler(), budget=budget)
+    handler2 = CompactMemoryHandler(max_len=10, target=NullHandler(), budget=budget)
+
+    handler1.handle(_record("11"))
+    handler1.handle(_record("12", ERROR))
+    assert budget.usage == 0
+
+    handler2.handle(_record("21"))
+    handler2.handle(_record("22"))
+    handler2.handle(_record("23"))
+
+    assert _messages(handler2) == ["22", "23"]
+    assert budget.usage == 2 * ENTRY_OVERHEAD + 4
+    assert handler2.evicted == 1
+
+
+def test_memory_budget_with_records(logger):
+    budget = MemoryBudget(max_bytes=3 * RECORD_OVERHEAD)
+    handler = LimitedMemoryHandler(max_len=2, target=NullHandler(), budget=budget)
+    logger.addHandler(handler)
+
+    logger.info("1")
+    logger.info("2")
+    logger.info("3")
+
+    assert [record.msg for record in handler.buffer] == ["2", "3"]
+    assert budget.usage == 2 * (RECORD_OVERHEAD + 1)
+
+    handler.change_max_len(1)
+    assert [record.msg for record in handler.buffer] == ["3"]
+    assert budget.usage == RECORD_OVERHEAD + 1
+
+    handler.flush()
+    assert budget.usage == 0
+    assert budget.evicted == 0
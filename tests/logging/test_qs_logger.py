@@ -1,14 +1,30 @@
 """Tests for cloudshell.logging.qs_logger."""
 
+import json
 import logging
+import multiprocessing
 import os
 import shutil
+import sys
+import time
+from contextvars import Context
 from logging import FileHandler
 from unittest import TestCase, mock
 from unittest.mock import MagicMock
 
 from cloudshell.logging import qs_logger
-from cloudshell.logging.memory_handler import LimitedMemoryHandler
+from cloudshell.logging.async_handler import AsyncHandler
+from cloudshell.logging.dispatch_handler import ContextDispatchHandler
+from cloudshell.logging.file_handlers import BufferedFileHandler
+from cloudshell.logging.forwarding import (
+    BatchForwardingHandler,
+    get_parent_address,
+    stop_forwarding_server,
+)
+from cloudshell.logging.memory_handler import CompactMemoryHandler, LimitedMemoryHandler
+from cloudshell.logging.rate_limit import RateLimitFilter
+from cloudshell.logging.rotation import RollingFileHandler
+from cloudshell.logging.shared_writer import SharedFileHandler
 
 CUR_DIR = os.path.dirname(__file__)
 full_settings = MagicMock(
@@ -44,6 +60,14 @@ wrong_settings = MagicMock(
 )
 
 
+def _log_in_child_process():
+    logger = qs_logger.get_qs_logger("forwarded", log_file_prefix="CHILD")
+    assert isinstance(logger.handlers[0], BatchForwardingHandler)
+    logger.info("child info")
+    qs_logger.get_qs_logger("forwarded")
+    logger.info("child info to the parent's file")
+
+
 class TestQSLogger(TestCase):
     _LOGS_PATH = os.path.join(os.path.dirname(__file__), "../../Logs")
 
@@ -59,6 +83,9 @@ class TestQSLogger(TestCase):
         if os.path.exists(self._LOGS_PATH):
             shutil.rmtree(self._LOGS_PATH)
 
+        qs_logger.invalidate_settings()
+        qs_logger.clear_log_path_cache()
+
     def tearDown(self):
         """Close all existing logging handlers after each suite."""
         if self.qs_conf:
@@ -79,8 +106,10 @@ class TestQSLogger(TestCase):
             logger.handlers.clear()
 
         qs_logger._LOGGER_CONTAINER.clear()
+        qs_logger._LOG_PATHS.clear()
 
         qs_logger.get_settings = self.get_settings
+        qs_logger.invalidate_settings()
 
     @mock.patch.dict("cloudshell.logging.qs_logger.os.environ", {"LOG_LEVEL": "DEBUG"})
     def test_get_settings_priority_env_default_level(self):
@@ -166,6 +195,24 @@ class TestQSLogger(TestCase):
 
         self.assertEqual(qs_logger.get_settings(), exp_response)
 
+    @mock.patch("cloudshell.logging.qs_logger.QSConfigParser")
+    def test_get_settings_cached(self, parser_class):
+        """Config is parsed only once while nothing is changed."""
+        parser = parser_class.return_value
+        parser.get_config.return_value = {"LOG_PRIORITY": "CONFIG"}
+
+        qs_logger.get_settings()
+        qs_logger.get_settings()
+        parser.get_config.assert_called_once()
+
+        with mock.patch.dict(os.environ, {"QS_MEMORY_LOG_SIZE": "10"}):
+            self.assertEqual(qs_logger.get_settings()["MEMORY_LOG_SIZE"], 10)
+        self.assertEqual(parser.get_config.call_count, 2)
+
+        qs_logger.invalidate_settings()
+        qs_logger.get_settings()
+        self.assertEqual(parser.get_config.call_count, 3)
+
     @mock.patch("cloudshell.logging.qs_logger.os")
     def test_get_log_path_config_from_environment_variable(self, os):
         """Check that method will primarily return log path.
@@ -221,6 +268,27 @@ class TestQSLogger(TestCase):
         path = qs_logger.get_accessible_log_path()
         self.assertTrue(os.path.dirname(path))
 
+    def test_get_qs_logger_creates_files_on_first_record(self):
+        """Directories and files are created when records are written."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("lazy")
+        file_hdlr, _ = logger.handlers[0].get_handlers("lazy", "QS")
+        self.assertFalse(os.path.exists(os.path.dirname(file_hdlr.baseFilename)))
+
+        logger.error("first record")
+        with open(file_hdlr.baseFilename) as f:
+            self.assertIn("first record", f.read())
+
+    def test_get_accessible_log_path_not_writable_parent(self):
+        """Path under a file can't be created, the default path is used."""
+        os.makedirs(self._LOGS_PATH)
+        not_dir = os.path.join(self._LOGS_PATH, "file")
+        open(not_dir, "w").close()
+        os.environ["LOG_PATH"] = not_dir
+        path = qs_logger.get_accessible_log_path("reservation_id")
+        self.assertFalse(path.startswith(not_dir))
+        self.assertIn("reservation_id", path)
+
     def test_get_accessible_log_path(self):
         """Test suite for get_accessible_log_path method."""
         path = qs_logger.get_accessible_log_path("reservation_id", "handler_name")
@@ -230,6 +298,25 @@ class TestQSLogger(TestCase):
             r"handler_name--\d{2}-\w+-\d{4}--\d{2}-\d{2}-\d{2}\.log",
         )
 
+    @mock.patch("cloudshell.logging.qs_logger.os.path.isdir", side_effect=os.path.isdir)
+    def test_get_accessible_log_path_cached(self, isdir):
+        """Writable directories are checked once per WRITABLE_DIR_TTL."""
+        qs_logger.get_accessible_log_path("reservation_id", "handler1")
+        qs_logger.get_accessible_log_path("reservation_id", "handler2")
+        self.assertEqual(isdir.call_count, 1)
+
+        with mock.patch.object(qs_logger, "WRITABLE_DIR_TTL", 0):
+            qs_logger.get_accessible_log_path("reservation_id", "handler3")
+        self.assertEqual(isdir.call_count, 2)
+
+    def test_get_accessible_log_path_with_config(self):
+        """Passed settings are used instead of reading them again."""
+        qs_logger.get_settings = MagicMock(side_effect=AssertionError)
+        path = qs_logger.get_accessible_log_path(
+            "reservation_id", "handler_name", full_settings()
+        )
+        self.assertIn("handler_name--", path)
+
     def test_get_accessible_log_path_log_path_setting_missing(self):
         """Test suite for get_accessible_log_path method."""
         if "LOG_PATH" in os.environ:
@@ -247,12 +334,318 @@ class TestQSLogger(TestCase):
     def test_get_qs_logger_full_settings_default_params(self):
         """Test suite for get_qs_logger method."""
         qs_logger.get_settings = full_settings
-        assert isinstance(qs_logger.get_qs_logger().handlers[0], FileHandler)
+        dispatcher = qs_logger.get_qs_logger().handlers[0]
+        assert isinstance(dispatcher, ContextDispatchHandler)
+        assert isinstance(dispatcher.get_handlers("Ungrouped", "QS")[0], FileHandler)
 
     def test_get_qs_logger_full_settings(self):
         """Test suite for get_qs_logger method."""
         qs_logger.get_settings = full_settings
-        assert isinstance(qs_logger.get_qs_logger("test1").handlers[0], FileHandler)
+        dispatcher = qs_logger.get_qs_logger("test1").handlers[0]
+        assert isinstance(dispatcher.get_handlers("test1", "QS")[0], FileHandler)
+
+    def test_get_qs_logger_without_context(self):
+        """Handlers are added to the logger directly without context."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("test1", use_context=False)
+        assert isinstance(logger.handlers[0], FileHandler)
+
+    @mock.patch.dict(os.environ, {"QS_ASYNC_WRITE": "True"})
+    def test_get_qs_logger_async_write(self):
+        """File handler writes records in the background thread."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("async")
+        hdlr, memory_hdlr = logger.handlers[0].get_handlers("async", "QS")
+        assert isinstance(hdlr, AsyncHandler)
+        assert isinstance(hdlr.target, FileHandler)
+        assert isinstance(memory_hdlr.target, AsyncHandler)
+
+        logger.error("async message")
+        hdlr.flush()
+
+        with open(hdlr.target.baseFilename) as f:
+            assert "async message" in f.read()
+
+    @mock.patch.dict(os.environ, {"QS_BUFFERED_WRITE": "True"})
+    def test_get_qs_logger_buffered_write(self):
+        """File handlers write records in batches."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("buffered")
+        file_hdlr, memory_hdlr = logger.handlers[0].get_handlers("buffered", "QS")
+        assert isinstance(file_hdlr, BufferedFileHandler)
+        assert isinstance(memory_hdlr.target, BufferedFileHandler)
+
+    @mock.patch.dict(
+        os.environ,
+        {"QS_SHARED_WRITER": "True", "QS_SHARED_WRITER_IDLE_TIMEOUT": "0.5"},
+    )
+    def test_get_qs_logger_shared_writer(self):
+        """File handlers write records through the writer process."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("shared")
+        file_hdlr, memory_hdlr = logger.handlers[0].get_handlers("shared", "QS")
+        assert isinstance(file_hdlr, SharedFileHandler)
+        assert isinstance(memory_hdlr.target, SharedFileHandler)
+
+    @mock.patch.dict(os.environ, {"QS_ROTATE_MAX_BYTES": "1048576"})
+    def test_get_qs_logger_rotation(self):
+        """Main and debug files are rotated."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("rotation")
+        file_hdlr, memory_hdlr = logger.handlers[0].get_handlers("rotation", "QS")
+        assert isinstance(file_hdlr, RollingFileHandler)
+        assert isinstance(memory_hdlr.target, RollingFileHandler)
+        assert file_hdlr.max_bytes == 1048576
+        # records are written immediately without BUFFERED_WRITE
+        assert file_hdlr.flush_bytes == 0
+
+    @mock.patch.dict(
+        os.environ,
+        {
+            "QS_RETENTION_MAX_AGE": "2",
+            "QS_RETENTION_MAX_BYTES": "100",
+            "QS_RETENTION_ACTIVE_TIME": "300",
+        },
+    )
+    def test_get_janitor(self):
+        """Janitor of the log directory uses quotas from the config."""
+        qs_logger.get_settings = full_settings
+        janitor = qs_logger.get_janitor()
+        assert janitor.root == os.environ["LOG_PATH"]
+        assert janitor.max_age == 2 * 24 * 60 * 60
+        assert janitor.max_bytes == 100
+        assert janitor.reservation_max_bytes == 0
+        assert janitor.active_time == 300
+        assert janitor.enabled
+
+    @mock.patch.dict(os.environ, {"QS_RATE_LIMIT": "DEBUG:1/1"})
+    def test_get_qs_logger_rate_limit(self):
+        """Handlers of the logger share one rate limit filter."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("limited")
+        qs_logger.get_qs_logger("limited2")
+        filters = [f for hdlr in logger.handlers for f in hdlr.filters]
+        rate_limit_filters = [f for f in filters if isinstance(f, RateLimitFilter)]
+        assert len(rate_limit_filters) == len(logger.handlers) == 2
+        assert rate_limit_filters[0] is rate_limit_filters[1]
+        assert rate_limit_filters[0].limits == {logging.DEBUG: (1, 1)}
+
+    @mock.patch.dict(os.environ, {"QS_RATE_LIMIT": "INFO:0.0001/4"})
+    def test_rate_limit_burst(self):
+        """Records are counted once by the handlers sharing the filter."""
+        settings = dict(full_settings(), LOG_LEVEL="INFO")
+        qs_logger.get_settings = MagicMock(return_value=settings)
+        # file and memory handlers
+        logger1 = qs_logger.get_qs_logger(
+            "burst", log_category="burst", use_context=False
+        )
+        file_hdlr = logger1.handlers[0]
+        # records without context pass the dispatcher and the missed logs handler
+        logger2 = qs_logger.get_qs_logger("burst2", log_category="burst2")
+        missing_context_hdlr = qs_logger._find_missing_context_handler(logger2)
+
+        for logger, hdlr in ((logger1, file_hdlr), (logger2, missing_context_hdlr)):
+            for i in range(6):
+                Context().run(logger.info, "message %d", i)
+            hdlr.flush()
+            with open(hdlr.baseFilename) as f:
+                messages = [line.split()[-1] for line in f.read().splitlines()]
+            self.assertEqual(messages[-4:], ["0", "1", "2", "3"])
+
+    def test_set_log_group_level(self):
+        """Level of one log group is changed without other groups."""
+        settings = dict(full_settings(), LOG_LEVEL="INFO", MEMORY_LOG_SIZE=0)
+        qs_logger.get_settings = MagicMock(return_value=settings)
+        logger = qs_logger.get_qs_logger("group1")
+        qs_logger.get_qs_logger("group2")
+        dispatcher = logger.handlers[0]
+        self.assertEqual(logger.level, logging.INFO)
+        self.assertFalse(logger.isEnabledFor(logging.DEBUG))
+
+        qs_logger.set_log_group_level("group1", "DEBUG")
+        self.assertEqual(logger.level, logging.DEBUG)
+        for group in ("group1", "group2"):
+            qs_logger.set_logger_context(group, "QS")
+            logger.debug(f"debug {group}")
+            dispatcher.get_handlers(group, "QS")[0].flush()
+
+        with open(dispatcher.get_handlers("group1", "QS")[0].baseFilename) as f:
+            self.assertIn("debug group1", f.read())
+        # nothing is written to group2, its file isn't created
+        group2_hdlr = dispatcher.get_handlers("group2", "QS")[0]
+        self.assertFalse(os.path.exists(group2_hdlr.baseFilename))
+
+        qs_logger.set_log_group_level("group1", None)
+        self.assertEqual(logger.level, logging.INFO)
+
+    def test_apply_settings(self):
+        """Changed settings are applied to live loggers without get_qs_logger."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("applied")
+        dispatcher = logger.handlers[0]
+        old_file_hdlr, _ = dispatcher.get_handlers("applied", "QS")
+        self.assertEqual(old_file_hdlr.level, logging.ERROR)
+
+        new_log_path = os.path.join(self._LOGS_PATH, "moved")
+        settings = dict(
+            full_settings(),
+            LOG_LEVEL="DEBUG",
+            LOG_FORMAT="%(levelname)s %(message)s",
+            MEMORY_LOG_SIZE=10,
+        )
+        with mock.patch.dict(os.environ, {"LOG_PATH": new_log_path}):
+            qs_logger.apply_settings(settings)
+
+        file_hdlr, memory_hdlr = dispatcher.get_handlers("applied", "QS")
+        self.assertIsNone(old_file_hdlr.stream)
+        self.assertTrue(
+            file_hdlr.baseFilename.startswith(os.path.abspath(new_log_path))
+        )
+        self.assertEqual(logger.level, logging.DEBUG)
+        self.assertEqual(file_hdlr.level, logging.DEBUG)
+        self.assertEqual(file_hdlr.formatter._fmt, "%(levelname)s %(message)s")
+        self.assertIs(memory_hdlr.target.formatter, file_hdlr.formatter)
+        self.assertEqual(memory_hdlr.max_len, 10)
+        missing_context_hdlr = qs_logger._find_missing_context_handler(logger)
+        self.assertTrue(
+            missing_context_hdlr.baseFilename.startswith(os.path.abspath(new_log_path))
+        )
+
+        qs_logger.set_logger_context("applied", "QS")
+        logger.debug("debug message")
+        file_hdlr.flush()
+        with open(file_hdlr.baseFilename) as f:
+            self.assertEqual(f.read(), "DEBUG debug message\n")
+
+    @mock.patch.dict(os.environ, {"QS_WATCH_CONFIG": "True"})
+    @mock.patch("cloudshell.logging.qs_logger.start_config_watcher")
+    def test_get_qs_logger_watch_config(self, start_config_watcher):
+        """Changes of the config file are applied by the watcher."""
+        qs_logger.get_settings = full_settings
+        qs_logger.get_qs_logger("watched")
+        start_config_watcher.assert_called_once_with(
+            qs_logger.get_config_path, qs_logger.apply_settings, 1.0
+        )
+
+    @mock.patch.dict(os.environ, {"QS_FORWARD_CHILD_LOGS": "True"})
+    def test_get_qs_logger_forwards_child_logs(self):
+        """Child processes log to the files of the parent."""
+        logger = qs_logger.get_qs_logger("forwarded")
+        dispatcher = logger.handlers[0]
+        try:
+            self.assertIsNone(get_parent_address())
+            process = multiprocessing.get_context("spawn").Process(
+                target=_log_in_child_process
+            )
+            process.start()
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+
+            # the last record is written to the parent's file
+            parent_hdlr = dispatcher.get_handlers("forwarded", "QS")[0]
+            deadline = time.monotonic() + 10
+            while True:
+                with open(parent_hdlr.baseFilename) as f:
+                    if "child info to the parent's file" in f.read():
+                        break
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+            child_hdlr = dispatcher.get_handlers("forwarded", "CHILD")[0]
+            with open(child_hdlr.baseFilename) as f:
+                self.assertIn("child info", f.read())
+        finally:
+            stop_forwarding_server()
+
+    @mock.patch.dict(os.environ, {"QS_MEMORY_LOG_MODE": "compact"})
+    def test_get_qs_logger_compact_memory_log(self):
+        """Memory handler keeps compact entries."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("compact")
+        _, memory_hdlr = logger.handlers[0].get_handlers("compact", "QS")
+        assert isinstance(memory_hdlr, CompactMemoryHandler)
+
+    @mock.patch.dict(os.environ, {"QS_LOG_OUTPUT": "json"})
+    def test_get_qs_logger_json_output(self):
+        """Main and debug files get JSON lines with the log context."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("json", log_file_prefix="PREFIX")
+        file_hdlr, memory_hdlr = logger.handlers[0].get_handlers("json", "PREFIX")
+        self.assertIsInstance(file_hdlr.formatter, qs_logger.JSONFormatter)
+        self.assertIs(memory_hdlr.target.formatter, file_hdlr.formatter)
+
+        logger.debug("first\nsecond")
+        logger.error("error")
+        file_hdlr.flush()
+        memory_hdlr.target.flush()
+
+        with open(file_hdlr.baseFilename) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records[-1]["message"], "error")
+        self.assertEqual(records[-1]["log_group"], "json")
+        self.assertEqual(records[-1]["prefix"], "PREFIX")
+        with open(memory_hdlr.target.baseFilename) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])["message"], "first\nsecond")
+
+    def test_get_qs_logger_formats_only_written_records(self):
+        """Dropped and evicted records are never formatted."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("lazy")
+        _, memory_hdlr = logger.handlers[0].get_handlers("lazy", "QS")
+        memory_hdlr.change_max_len(2)
+        formatted = qs_logger.FORMAT_STATS["formatted"]
+
+        for i in range(10):
+            logger.debug("message %s", i)
+        qs_logger.set_logger_context("unknown", "QS")
+        logger.error("without route")
+        self.assertEqual(qs_logger.FORMAT_STATS["formatted"], formatted)
+        self.assertEqual(memory_hdlr.discarded, 8)
+
+        qs_logger.set_logger_context("lazy", "QS")
+        logger.error("error")
+        # the last buffered record and the error, it's written to both files
+        self.assertEqual(qs_logger.FORMAT_STATS["formatted"], formatted + 2)
+        self.assertEqual(memory_hdlr.discarded, 9)
+
+    @mock.patch.dict(os.environ, {"QS_LOG_GROUP_MAX": "1"})
+    def test_get_qs_logger_evicts_log_groups(self):
+        """Least recently used log group is closed and reopened on use."""
+        qs_logger.get_settings = full_settings
+        logger = qs_logger.get_qs_logger("group1")
+        dispatcher = logger.handlers[0]
+        file_hdlr, _ = dispatcher.get_handlers("group1", "QS")
+        log_path = file_hdlr.baseFilename
+
+        qs_logger.get_qs_logger("group2")
+
+        assert dispatcher.get_handlers("group1", "QS") == ()
+        assert file_hdlr.stream is None
+        assert "group1" not in qs_logger._LOGGER_CONTAINER
+
+        qs_logger.set_logger_context("group1", "QS")
+        logger.error("reopened")
+
+        file_hdlr, _ = dispatcher.get_handlers("group1", "QS")
+        assert file_hdlr.baseFilename == log_path
+        with open(log_path) as f:
+            assert "reopened" in f.read()
+
+    @mock.patch.dict(os.environ, {"QS_LOG_GROUP_MAX": "1"})
+    def test_reopened_log_group_doesnt_log_exec_info(self):
+        qs_logger.get_settings = full_settings
+        exec_info = {"ERROR": {"Python version": "3"}}
+        logger = qs_logger.get_qs_logger("group1", exec_info=exec_info)
+        dispatcher = logger.handlers[0]
+        qs_logger.get_qs_logger("group2")
+
+        qs_logger.get_qs_logger("group1", exec_info=exec_info)
+        file_hdlr, _ = dispatcher.get_handlers("group1", "QS")
+        file_hdlr.flush()
+
+        with open(file_hdlr.baseFilename) as f:
+            self.assertEqual(f.read().count("Python version"), 1)
 
     def test_get_qs_logger_stream_handler(self):
         """Test suite for get_qs_logger method."""
@@ -261,9 +654,9 @@ class TestQSLogger(TestCase):
         qs_logger.get_settings = cut_settings
 
         logger = qs_logger.get_qs_logger(log_group="stream")
-        # the logger has several handlers cause of previous tests
-        # but log records would be filtered by context
-        assert isinstance(logger.handlers[-1], logging.StreamHandler)
+        dispatcher = logger.handlers[-1]
+        hdlr = dispatcher.get_handlers("stream", "QS")[-1]
+        assert isinstance(hdlr, logging.StreamHandler)
 
     def test_get_qs_logger_container_filling(self):
         """Test suite for get_qs_logger method."""
@@ -285,7 +678,7 @@ class TestQSLogger(TestCase):
         os.environ["LOG_LEVEL"] = "INCORRECT"
         logger = qs_logger.get_qs_logger()
         assert logger.level == logging.DEBUG
-        for hdrl in logger.handlers:
+        for hdrl in qs_logger._iter_handlers(logger):
             if isinstance(hdrl, LimitedMemoryHandler):
                 assert hdrl.level == logging.NOTSET
             else:
@@ -312,6 +705,17 @@ class TestQSLogger(TestCase):
         """Test suite for normalize_buffer method."""
         self.assertEqual(qs_logger.normalize_buffer("\r\n \n\r"), "\n \n\r")
 
+    def test_normalize_buffer_carriage_return_with_colors(self):
+        """Test suite for normalize_buffer method."""
+        self.assertEqual(
+            qs_logger.normalize_buffer("a\r\033[0m\nb\r\x00\n"), "a\nb\r\n"
+        )
+
+    def test_normalize_buffer_printable_ascii_unchanged(self):
+        """Test suite for normalize_buffer method."""
+        msg = "plain printable message"
+        self.assertIs(qs_logger.normalize_buffer(msg), msg)
+
     def test_normalize_buffer_converts_tuple_to_string(self):
         """Test suite for normalize_buffer method."""
         self.assertEqual(
@@ -323,3 +727,109 @@ class TestQSLogger(TestCase):
         self.assertEqual(
             qs_logger.normalize_buffer({"test": "dict"}), "{'test': 'dict'}"
         )
+
+
+class TestMultiLineFormatter(TestCase):
+    def _record(self, msg, *args, **kwargs):
+        return logging.makeLogRecord(
+            {"msg": msg, "args": args, "levelname": "INFO", **kwargs}
+        )
+
+    def test_format_adds_header_to_each_line(self):
+        formatter = qs_logger.MultiLineFormatter("[%(levelname)s] %(message)s!")
+        record = self._record("first %s\nsecond\r\nthird", "\033[32mline")
+
+        self.assertEqual(
+            formatter.format(record),
+            "[INFO] first line\n[INFO] second\n[INFO] third!",
+        )
+        # message is not changed
+        self.assertEqual(record.msg, "first %s\nsecond\r\nthird")
+
+    def test_format_adds_header_to_exception_lines(self):
+        formatter = qs_logger.MultiLineFormatter("[%(levelname)s] %(message)s")
+        try:
+            raise ValueError("error")
+        except ValueError:
+            record = self._record("message", exc_info=sys.exc_info())
+
+        lines = formatter.format(record).splitlines()
+
+        self.assertEqual(lines[0], "[INFO] message")
+        self.assertEqual(lines[-1], "[INFO] ValueError: error")
+        self.assertTrue(all(line.startswith("[INFO] ") for line in lines))
+
+    def test_format_with_other_style(self):
+        formatter = qs_logger.MultiLineFormatter("[{levelname}] {message}", style="{")
+        record = self._record("first\nsecond")
+
+        self.assertEqual(formatter.format(record), "[INFO] first\n[INFO] second")
+
+    def test_format_empty_message(self):
+        formatter = qs_logger.MultiLineFormatter("[%(levelname)s] %(message)s")
+
+        self.assertEqual(formatter.format(self._record("")), "")
+
+    @mock.patch(
+        "cloudshell.logging.qs_logger.normalize_buffer",
+        side_effect=qs_logger.normalize_buffer,
+    )
+    def test_format_cached_by_format(self, normalize_buffer):
+        formatter1 = qs_logger.MultiLineFormatter("[%(levelname)s] %(message)s")
+        formatter2 = qs_logger.MultiLineFormatter("[%(levelname)s] %(message)s")
+        formatter3 = qs_logger.MultiLineFormatter("%(levelname)s: %(message)s")
+        record = self._record("message")
+
+        self.assertEqual(formatter1.format(record), "[INFO] message")
+        self.assertEqual(formatter2.format(record), "[INFO] message")
+        self.assertEqual(normalize_buffer.call_count, 1)
+        self.assertEqual(formatter3.format(record), "INFO: message")
+        self.assertEqual(normalize_buffer.call_count, 2)
+
+
+class TestJSONFormatter(TestCase):
+    def _record(self, msg, *args, **kwargs):
+        return logging.makeLogRecord(
+            {"msg": msg, "args": args, "levelname": "INFO", **kwargs}
+        )
+
+    def test_format_one_line_per_record(self):
+        formatter = qs_logger.JSONFormatter()
+        record = self._record("first %s\nsecond", "\033[32mline", lineno=10)
+
+        s = Context().run(formatter.format, record)
+
+        self.assertNotIn("\n", s)
+        data = json.loads(s)
+        self.assertEqual(data["message"], "first line\nsecond")
+        self.assertEqual(data["level"], "INFO")
+        self.assertEqual(data["line"], 10)
+        self.assertNotIn("log_group", data)
+
+    def test_format_empty_message(self):
+        formatter = qs_logger.JSONFormatter()
+
+        data = json.loads(Context().run(formatter.format, self._record("")))
+
+        self.assertEqual(data["message"], "")
+        self.assertEqual(data["level"], "INFO")
+
+    def test_format_with_log_context(self):
+        formatter = qs_logger.JSONFormatter()
+        record = self._record("message", log_context=("reservation", "QS"))
+
+        data = json.loads(formatter.format(record))
+
+        self.assertEqual(data["log_group"], "reservation")
+        self.assertEqual(data["prefix"], "QS")
+
+    def test_format_exception(self):
+        formatter = qs_logger.JSONFormatter()
+        try:
+            raise ValueError("error")
+        except ValueError:
+            record = self._record("message", exc_info=sys.exc_info())
+
+        data = json.loads(formatter.format(record))
+
+        self.assertTrue(data["exc_info"].endswith("ValueError: error"))
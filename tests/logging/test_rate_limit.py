@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from logging import DEBUG, INFO, WARNING, getLogger
+from logging.handlers import BufferingHandler
+
+import pytest
+
+from cloudshell.logging.rate_limit import Limit, RateLimitFilter, parse_limits
+
+
+class ListHandler(BufferingHandler):
+    def __init__(self):
+        super().__init__(1000)
+
+    def shouldFlush(self, record):
+        return False
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cloudshell.logging.rate_limit.time.monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture()
+def handler():
+    return ListHandler()
+
+
+@pytest.fixture()
+def logger(handler):
+    logger = getLogger(__name__)
+    logger.setLevel(DEBUG)
+    logger.addHandler(handler)
+    yield logger
+    logger.removeHandler(handler)
+
+
+def _messages(handler):
+    return [record.getMessage() for record in handler.buffer]
+
+
+def test_parse_limits():
+    assert parse_limits("DEBUG:10/100, INFO:5") == {
+        DEBUG: Limit(10, 100),
+        INFO: Limit(5, 5),
+    }
+    with pytest.raises(ValueError):
+        parse_limits("UNKNOWN:1/1")
+
+
+def test_limit_by_site(logger, handler, clock):
+    handler.addFilter(RateLimitFilter({DEBUG: Limit(1, 2)}))
+
+    for i in range(5):
+        logger.debug("first %s", i)
+    logger.debug("second")
+
+    assert _messages(handler) == ["first 0", "first 1", "second"]
+
+
+def test_levels_without_limit_pass(logger, handler, clock):
+    handler.addFilter(RateLimitFilter({DEBUG: Limit(1, 1)}))
+
+    for i in range(3):
+        logger.warning("warning %s", i)
+
+    assert len(handler.buffer) == 3
+
+
+def test_tokens_refill(logger, handler, clock):
+    filter_ = RateLimitFilter({INFO: Limit(2, 1)})
+    handler.addFilter(filter_)
+
+    for _ in range(3):
+        for i in range(2):
+            logger.info("message %s", i)
+        clock[0] += 0.5
+
+    assert _messages(handler) == ["message 0"] * 3
+    assert filter_.suppressed == 3
+
+
+def test_summary_of_suppressed_records(logger, handler, clock):
+    handler.addFilter(RateLimitFilter({INFO: Limit(1, 1)}, summary_interval=10))
+
+    # the same log site
+    for pause in (0, 0, 0, 0, 0, 5, 5):
+        clock[0] += pause
+        logger.info("message")
+
+    assert _messages(handler) == [
+        "message",
+        "message",
+        "Suppressed 4 similar messages",
+        "message",
+    ]
+    assert handler.buffer[-2].levelno == INFO
+
+
+def test_max_sites(logger, handler, clock):
+    filter_ = RateLimitFilter({WARNING: Limit(1, 1)}, max_sites=1)
+    handler.addFilter(filter_)
+
+    for _ in range(2):
+        logger.warning("first")
+        logger.warning("second")
+
+    assert len(filter_._sites) == 1
+    assert len(handler.buffer) == 4
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import gzip
+import os
+from logging import INFO, Formatter, makeLogRecord
+
+import pytest
+
+from cloudshell.logging.rotation import (
+    Compression,
+    RollingFileHandler,
+    compress_file,
+    get_compressor,
+)
+
+
+def _handler(log_path, **kwargs):
+    handler = RollingFileHandler(log_path, **kwargs)
+    handler.setFormatter(Formatter("%(message)s"))
+    return handler
+
+
+def _log(handler, msg):
+    handler.handle(makeLogRecord({"msg": msg, "levelno": INFO}))
+
+
+def test_rotate_by_size(tmp_path):
+    log_path = tmp_path / "QS.log"
+    handler = _handler(log_path, max_bytes=10)
+
+    for msg in ("1234", "5678", "90"):
+        _log(handler, msg)
+    handler.close()
+    get_compressor().join()
+
+    segments = handler.get_segments()
+    assert len(segments) == 1
+    with open(segments[0]) as f:
+        assert f.read() == "1234\n5678\n"
+    assert log_path.read_text() == "90\n"
+
+
+def test_rotate_by_time(tmp_path):
+    log_path = tmp_path / "QS.log"
+    handler = _handler(log_path, interval=3600)
+    _log(handler, "1")
+    handler._rollover_at = 0
+
+    _log(handler, "2")
+    handler.close()
+    get_compressor().join()
+
+    segments = handler.get_segments()
+    assert len(segments) == 1
+    assert log_path.read_text() == "2\n"
+    assert handler._rollover_at > 0
+
+
+def test_rotated_segments_compressed_and_pruned(tmp_path):
+    log_path = tmp_path / "QS.log"
+    handler = _handler(
+        log_path, max_bytes=2, backup_count=2, compression=Compression.GZIP
+    )
+
+    for i in range(5):
+        _log(handler, str(i))
+    handler.close()
+    get_compressor().join()
+
+    segments = handler.get_segments()
+    assert len(segments) == 2
+    assert all(segment.endswith(".log.gz") for segment in segments)
+    with gzip.open(segments[-1], "rt") as f:
+        assert f.read() == "3\n"
+    assert log_path.read_text() == "4\n"
+
+
+def test_segments_sorted_by_name(tmp_path):
+    names = [
+        "QS.20261018-100000.log.gz",
+        "QS.20261018-100000.1.log",
+        "QS.20261018-100000.10.log.gz",
+        "QS.20261018-110000.log",
+    ]
+    for i, name in enumerate(names):
+        path = tmp_path / name
+        path.write_text("message\n")
+        # older segments compressed later
+        os.utime(path, (100 - i, 100 - i))
+    handler = _handler(tmp_path / "QS.log")
+
+    assert handler.get_segments() == [str(tmp_path / name) for name in names]
+    handler.close()
+
+
+def test_compressor_survives_errors(tmp_path, monkeypatch):
+    def compress_file(path, compression):
+        raise ValueError(path)
+
+    monkeypatch.setattr("cloudshell.logging.rotation.compress_file", compress_file)
+    handler = _handler(tmp_path / "QS.log", max_bytes=2, compression=Compression.GZIP)
+    for i in range(2):
+        _log(handler, str(i))
+    get_compressor().join()
+    monkeypatch.undo()
+
+    _log(handler, "2")
+    handler.close()
+    get_compressor().join()
+
+    first, second = handler.get_segments()
+    assert first.endswith(".log")
+    assert second.endswith(".log.gz")
+
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError):
+        RollingFileHandler(tmp_path / "QS.log", compression="zip")
+
+
+def test_compress_file_zstd_falls_back_to_gzip(tmp_path, monkeypatch):
+    monkeypatch.setattr("cloudshell.logging.rotation.zstandard", None)
+    path = tmp_path / "QS.1.log"
+    path.write_text("message\n")
+
+    compressed = compress_file(str(path), Compression.ZSTD)
+
+    assert compressed == str(path) + ".gz"
+    assert not path.exists()
+    with gzip.open(compressed, "rt") as f:
+        assert f.read() == "message\n"
+
+
+def test_compress_file_uses_unique_temporary_file(tmp_path):
+    path = tmp_path / "QS.1.log"
+    path.write_text("message\n")
+    # temporary file of another process compressing the file
+    (tmp_path / "QS.1.log.gz.tmp").write_text("other")
+
+    compressed = compress_file(str(path), Compression.GZIP)
+
+    assert (tmp_path / "QS.1.log.gz.tmp").read_text() == "other"
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "QS.1.log.gz",
+        "QS.1.log.gz.tmp",
+    ]
+    with gzip.open(compressed, "rt") as f:
+        assert f.read() == "message\n"
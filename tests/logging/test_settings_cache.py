@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from cloudshell.logging.settings_cache import SettingsCache
+
+
+@pytest.fixture()
+def config_path(tmp_path):
+    path = tmp_path / "qs_config.ini"
+    path.write_text("[Logging]\n")
+    return path
+
+
+@pytest.fixture()
+def loader():
+    return MagicMock(side_effect=lambda: {"LOG_LEVEL": "INFO"})
+
+
+@pytest.fixture()
+def cache(loader, config_path, monkeypatch):
+    monkeypatch.delenv("TEST_LOG_LEVEL", raising=False)
+    return SettingsCache(loader, lambda: str(config_path), ["TEST_LOG_LEVEL"])
+
+
+def test_settings_loaded_once(cache, loader):
+    assert cache.get() == {"LOG_LEVEL": "INFO"}
+    assert cache.get() == {"LOG_LEVEL": "INFO"}
+
+    loader.assert_called_once()
+    assert cache.generation == 1
+
+
+def test_settings_returns_copy(cache):
+    cache.get()["LOG_LEVEL"] = "DEBUG"
+
+    assert cache.get() == {"LOG_LEVEL": "INFO"}
+
+
+def test_settings_reloaded_on_file_change(cache, loader, config_path):
+    cache.get()
+    stat = config_path.stat()
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    cache.get()
+
+    assert loader.call_count == 2
+
+
+def test_settings_reloaded_on_env_change(cache, loader, monkeypatch):
+    cache.get()
+    monkeypatch.setenv("TEST_LOG_LEVEL", "DEBUG")
+    cache.get()
+    cache.get()
+
+    assert loader.call_count == 2
+
+
+def test_settings_cached_for_missing_file(loader, tmp_path):
+    cache = SettingsCache(loader, lambda: str(tmp_path / "missing.ini"), [])
+
+    cache.get()
+    cache.get()
+
+    loader.assert_called_once()
+
+
+def test_settings_invalidate(cache, loader):
+    cache.get()
+    cache.invalidate()
+    cache.get()
+
+    assert loader.call_count == 2
+    assert cache.generation == 2
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import tempfile
+import time
+from logging import INFO, Formatter, getLogger, makeLogRecord
+from unittest import mock
+
+import pytest
+
+from cloudshell.logging import shared_writer
+from cloudshell.logging.shared_writer import (
+    SharedFileHandler,
+    get_file_key,
+    get_writer_address,
+)
+
+pytestmark = pytest.mark.skipif(
+    os.name == "nt", reason="the writer is tested with Unix sockets"
+)
+
+IDLE_TIMEOUT = 0.5
+
+
+def _write_records(log_path, process_num, count):
+    handler = SharedFileHandler(log_path, flush_bytes=100, idle_timeout=IDLE_TIMEOUT)
+    handler.setFormatter(Formatter("%(message)s"))
+    for i in range(count):
+        record = makeLogRecord({"msg": f"{process_num} {i}", "levelno": INFO})
+        handler.handle(record)
+    handler.close()
+
+
+def _wait_writer_exits(log_dir, timeout=10):
+    address, _ = get_writer_address(log_dir)
+    deadline = time.monotonic() + timeout
+    while os.path.exists(address) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not os.path.exists(address)
+
+
+def test_get_file_key():
+    assert get_file_key("QS--18-Oct-2026--12-54-10.log") == "QS.log"
+    assert get_file_key("QS--18-Oct-2026--12-54-10-debug.log") == "QS-debug.log"
+    assert get_file_key("missed_logs.log") == "missed_logs.log"
+
+
+def test_processes_write_to_one_file(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(
+            target=_write_records, args=(str(tmp_path / f"QS--{num}.log"), num, 200)
+        )
+        for num in range(3)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    assert _wait_writer_exits(str(tmp_path))
+    log_files = list(tmp_path.iterdir())
+    assert len(log_files) == 1
+    lines = log_files[0].read_text().splitlines()
+    assert len(lines) == 600
+    for num in range(3):
+        # records of each process are written in order
+        process_lines = [line for line in lines if line.startswith(f"{num} ")]
+        assert process_lines == [f"{num} {i}" for i in range(200)]
+
+
+def test_handler_reconnects_after_writer_exits(tmp_path):
+    log_path = tmp_path / "QS--1.log"
+    handler = SharedFileHandler(log_path, idle_timeout=IDLE_TIMEOUT)
+    handler.setFormatter(Formatter("%(message)s"))
+    handler.handle(makeLogRecord({"msg": "first", "levelno": INFO}))
+    handler.close()
+    assert _wait_writer_exits(str(tmp_path))
+
+    handler = SharedFileHandler(tmp_path / "QS--2.log", idle_timeout=IDLE_TIMEOUT)
+    handler.setFormatter(Formatter("%(message)s"))
+    handler.handle(makeLogRecord({"msg": "second", "levelno": INFO}))
+    handler.close()
+    assert _wait_writer_exits(str(tmp_path))
+
+    assert log_path.read_text() == "first\n"
+    assert (tmp_path / "QS--2.log").read_text() == "second\n"
+
+
+def test_handler_writes_to_own_file_without_writer(tmp_path, capsys):
+    log_path = tmp_path / "QS--1.log"
+    handler = SharedFileHandler(log_path, delay=True)
+    handler.setFormatter(Formatter("%(message)s"))
+    # the handler gets records of the logger of the module
+    logger = getLogger("cloudshell")
+    logger.addHandler(handler)
+    try:
+        with mock.patch.object(
+            shared_writer, "connect", side_effect=OSError("unreachable")
+        ) as connect:
+            getLogger("cloudshell.test").error("boom")
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    assert connect.call_count == 1
+    assert log_path.read_text() == "boom\n"
+    assert "unreachable" in capsys.readouterr().err
+
+
+def test_runtime_dir_accessible_by_others_isnt_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "gettempdir", lambda: str(tmp_path))
+    runtime_dir = tmp_path / f"cloudshell-logging-{os.getuid()}"
+    runtime_dir.mkdir(mode=0o777)
+    runtime_dir.chmod(0o777)
+
+    with pytest.raises(PermissionError):
+        get_writer_address(str(tmp_path / "logs"))
+
+    runtime_dir.chmod(0o700)
+    address, _ = get_writer_address(str(tmp_path / "logs"))
+    assert os.path.dirname(address) == str(runtime_dir)